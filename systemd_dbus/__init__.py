@@ -1 +1,37 @@
+from typing import Any, TYPE_CHECKING
+
+from .barrier import *
+from .deadline import *
+from .dependencies import *
+from .events import *
+from .reconciler import *
 from .systemd import *
+from .transport import *
+from .transport import TRANSPORT_BACKENDS
+
+if TYPE_CHECKING:
+    from .managers import *
+    from .replay import *
+    from .snapshot import *
+
+# Modules not needed by the core client are only imported when one of their names is first used
+LAZY_MODULES = {
+    '.managers': ['SystemdManagers'],
+    '.replay': ['RECORDING_MAGIC', 'RECORDING_VERSION', 'RecordedSignal', 'ReplayReport', 'SignalRecorder',
+                'SignalReplayer', 'read_signals'],
+    '.snapshot': ['SNAPSHOT_MAGIC', 'SNAPSHOT_VERSION', 'FULL_SNAPSHOT', 'DELTA_SNAPSHOT', 'SnapshotDiff',
+                  'SnapshotReader', 'SnapshotRecorder', 'write_snapshot', 'diff_snapshots', 'apply_delta']
+}
+
+
+def __getattr__(name: str) -> Any:
+    # Transport backends are only imported when they are first used
+    lazy_names = [(module_name, class_name) for module_name, class_name in TRANSPORT_BACKENDS.values()]
+    lazy_names.extend((module_name, attribute_name)
+                      for module_name, attribute_names in LAZY_MODULES.items() for attribute_name in attribute_names)
+
+    for module_name, attribute_name in lazy_names:
+        if name == attribute_name:
+            from importlib import import_module
+            return getattr(import_module(module_name, __name__), attribute_name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
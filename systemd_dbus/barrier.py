@@ -0,0 +1,62 @@
+# SPDX-FileCopyrightText: 2024 Ferenc Nandor Janky <ferenj@effective-range.com>
+# SPDX-FileCopyrightText: 2024 Attila Gombos <attila.gombos@effective-range.com>
+# SPDX-License-Identifier: MIT
+
+import time
+from dataclasses import dataclass, field
+from threading import Condition
+from typing import Optional
+
+
+@dataclass
+class BarrierResult(object):
+    """Outcome of waiting for multiple units to reach their target states."""
+    success: bool
+    states: dict[str, Optional[str]] = field(default_factory=dict)
+    pending: list[str] = field(default_factory=list)
+    failed: list[str] = field(default_factory=list)
+
+
+class StateBarrier(object):
+    """Barrier released when every unit reached its target active state or any of them failed."""
+
+    FAILED_STATE = 'failed'
+
+    def __init__(self, target_states: dict[str, str]) -> None:
+        self._target_states = target_states
+        self._states: dict[str, Optional[str]] = {unit_name: None for unit_name in target_states}
+        self._condition = Condition()
+
+    def update(self, unit_name: str, active_state: str, only_if_unset: bool = False) -> None:
+        """Update the state of a unit, with only_if_unset a state already received is not overwritten."""
+        with self._condition:
+            if unit_name in self._states and not (only_if_unset and self._states[unit_name] is not None):
+                self._states[unit_name] = active_state
+                self._condition.notify_all()
+
+    def wait(self, timeout: float) -> BarrierResult:
+        deadline = time.monotonic() + timeout
+
+        with self._condition:
+            while not self._is_released():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            return self._get_result()
+
+    def _is_released(self) -> bool:
+        return not self._get_pending() or bool(self._get_failed())
+
+    def _get_pending(self) -> list[str]:
+        return [unit_name for unit_name, target_state in self._target_states.items()
+                if self._states[unit_name] != target_state]
+
+    def _get_failed(self) -> list[str]:
+        return [unit_name for unit_name, target_state in self._target_states.items()
+                if self._states[unit_name] == self.FAILED_STATE != target_state]
+
+    def _get_result(self) -> BarrierResult:
+        pending = self._get_pending()
+        return BarrierResult(not pending, dict(self._states), pending, self._get_failed())
@@ -0,0 +1,79 @@
+# SPDX-FileCopyrightText: 2024 Ferenc Nandor Janky <ferenj@effective-range.com>
+# SPDX-FileCopyrightText: 2024 Attila Gombos <attila.gombos@effective-range.com>
+# SPDX-License-Identifier: MIT
+
+import struct
+from typing import Any
+
+# Type tag of the encoded values, followed by fixed size or length prefixed data
+MISSING_TAG = 0
+_FALSE = 1
+_TRUE = 2
+_INT = 3
+_UINT = 4
+_FLOAT = 5
+_STRING = 6
+_LIST = 7
+_TUPLE = 8
+_DICT = 9
+_BYTES = 10
+
+_U32 = struct.Struct('<I')
+_INT64_RANGE = range(-2 ** 63, 2 ** 63)
+
+
+def encode_value(value: Any) -> bytes:
+    """Encode a value converted to plain Python types, None is encoded as missing."""
+    if value is None:
+        return bytes([MISSING_TAG])
+    if isinstance(value, bool):
+        return bytes([_TRUE if value else _FALSE])
+    if isinstance(value, int):
+        if value in _INT64_RANGE:
+            return bytes([_INT]) + struct.pack('<q', value)
+        return bytes([_UINT]) + struct.pack('<Q', value)
+    if isinstance(value, float):
+        return bytes([_FLOAT]) + struct.pack('<d', value)
+    if isinstance(value, str):
+        encoded = value.encode()
+        return bytes([_STRING]) + _U32.pack(len(encoded)) + encoded
+    if isinstance(value, bytes):
+        return bytes([_BYTES]) + _U32.pack(len(value)) + value
+    if isinstance(value, (list, tuple)):
+        tag = _TUPLE if isinstance(value, tuple) else _LIST
+        return bytes([tag]) + _U32.pack(len(value)) + b''.join(encode_value(item) for item in value)
+    if isinstance(value, dict):
+        return bytes([_DICT]) + _U32.pack(len(value)) + b''.join(
+            encode_value(key) + encode_value(item) for key, item in value.items())
+    raise ValueError(f'Unsupported value type: {type(value).__name__}')
+
+
+def decode_value(data: Any, offset: int) -> tuple[Any, int]:
+    """Decode the value at offset, returns the value and the offset after it."""
+    tag = data[offset]
+    offset += 1
+
+    if tag == MISSING_TAG:
+        return None, offset
+    if tag in (_FALSE, _TRUE):
+        return tag == _TRUE, offset
+    if tag in (_INT, _UINT, _FLOAT):
+        fmt = {_INT: '<q', _UINT: '<Q', _FLOAT: '<d'}[tag]
+        return struct.unpack_from(fmt, data, offset)[0], offset + 8
+
+    length = _U32.unpack_from(data, offset)[0]
+    offset += _U32.size
+
+    if tag == _STRING:
+        return bytes(data[offset:offset + length]).decode(), offset + length
+    if tag == _BYTES:
+        return bytes(data[offset:offset + length]), offset + length
+
+    items = []
+    for _ in range(length * 2 if tag == _DICT else length):
+        item, offset = decode_value(data, offset)
+        items.append(item)
+
+    if tag == _DICT:
+        return dict(zip(items[::2], items[1::2])), offset
+    return tuple(items) if tag == _TUPLE else items, offset
@@ -0,0 +1,58 @@
+# SPDX-FileCopyrightText: 2024 Ferenc Nandor Janky <ferenj@effective-range.com>
+# SPDX-FileCopyrightText: 2024 Attila Gombos <attila.gombos@effective-range.com>
+# SPDX-License-Identifier: MIT
+
+from typing import Any, Optional
+
+import dbus
+from dbus import DBusException
+
+from .transport import Transport, TransportError, to_python
+
+
+class DbusPythonTransport(Transport):
+    """Transport on top of dbus-python, signals are dispatched by the main loop of the application."""
+
+    NOT_SUPPORTED_ERROR = 'org.freedesktop.DBus.Error.NotSupported'
+
+    def __init__(self, bus: Any = None) -> None:
+        self._bus = bus
+
+    def call_method(self, bus_name: str, object_path: str, interface: str, method: str, *args: Any,
+                    timeout: Optional[float] = None) -> Any:
+        # Without timeout dbus-python applies its default reply timeout
+        call_args = {} if timeout is None else {'timeout': timeout}
+
+        try:
+            proxy_object = self._get_bus().get_object(bus_name, object_path)
+            return self.to_python(proxy_object.get_dbus_method(method, interface)(*args, **call_args))
+        except DBusException as error:
+            raise TransportError(error.get_dbus_message(), error.get_dbus_name()) from error
+
+    def add_signal_receiver(self, handler: Any, signal_name: str, interface: str, bus_name: Optional[str] = None,
+                            path: Optional[str] = None, path_keyword: Optional[str] = None) -> Any:
+        match_args = {'bus_name': bus_name, 'path': path, 'path_keyword': path_keyword}
+
+        try:
+            return self._get_bus().add_signal_receiver(
+                handler, signal_name, interface, **{key: value for key, value in match_args.items() if value})
+        except DBusException as error:
+            raise TransportError(error.get_dbus_message(), error.get_dbus_name()) from error
+        except RuntimeError as error:
+            # Raised when the connection is not attached to a main loop
+            raise TransportError(str(error), self.NOT_SUPPORTED_ERROR) from error
+
+    def to_python(self, value: Any) -> Any:
+        if isinstance(value, dbus.Boolean):
+            return bool(value)
+        return to_python(value, self.to_python)
+
+    def close(self) -> None:
+        if self._bus is not None:
+            self._bus.close()
+            self._bus = None
+
+    def _get_bus(self) -> Any:
+        if self._bus is None:
+            self._bus = dbus.SystemBus()
+        return self._bus
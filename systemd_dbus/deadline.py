@@ -0,0 +1,154 @@
+# SPDX-FileCopyrightText: 2024 Ferenc Nandor Janky <ferenj@effective-range.com>
+# SPDX-FileCopyrightText: 2024 Attila Gombos <attila.gombos@effective-range.com>
+# SPDX-License-Identifier: MIT
+
+import time
+from collections import OrderedDict, Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, Optional, Iterator
+
+from context_logger import get_logger
+
+from .transport import Transport, TransportError
+
+log = get_logger('DeadlineTransport')
+
+
+@dataclass
+class Deadline(object):
+    """Deadline of the calls made in a scope, records whether any result was served from cache."""
+    expires_at: float
+    stale: bool = False
+    missed: int = 0
+    # Calls of the scope may run concurrently in copies of the context, sharing this deadline
+    _lock: Lock = field(default_factory=Lock, init=False, repr=False, compare=False)
+
+    def get_remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def add_misses(self, missed: int, stale: bool) -> None:
+        with self._lock:
+            self.missed += missed
+            self.stale = self.stale or stale
+
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar('deadline', default=None)
+_last_call_stale: ContextVar[bool] = ContextVar('last_call_stale', default=False)
+
+
+class DeadlineTransport(Transport):
+    """Applies per-method and scoped deadlines on top of another transport."""
+
+    NO_REPLY_ERROR = 'org.freedesktop.DBus.Error.NoReply'
+    TIMEOUT_ERRORS = [NO_REPLY_ERROR, 'org.freedesktop.DBus.Error.Timeout', 'org.freedesktop.DBus.Error.TimedOut']
+    # Methods without side effects, their last result can stand in for a missed reply
+    READ_ONLY_METHODS = ['Get', 'GetAll', 'GetUnit', 'LoadUnit', 'GetUnitFileState', 'ListUnits', 'ListUnitsByNames',
+                         'ListUnitsByPatterns', 'ListUnitsFiltered', 'ListUnitFiles', 'ListUnitFilesByPatterns',
+                         'ListJobs']
+    MAX_CACHE_SIZE = 4096
+
+    def __init__(self, transport: Transport, timeouts: Optional[dict[str, float]] = None,
+                 default_timeout: Optional[float] = None, stale_fallback: bool = False) -> None:
+        self._transport = transport
+        self._timeouts = timeouts or {}
+        self._default_timeout = default_timeout
+        self._stale_fallback = stale_fallback
+        self._cache: OrderedDict[tuple[Any, ...], Any] = OrderedDict()
+        self._misses: Counter[str] = Counter()
+        self._stale_results: Counter[str] = Counter()
+        self._lock = Lock()
+
+    @property
+    def transport(self) -> Transport:
+        return self._transport
+
+    @property
+    def last_call_stale(self) -> bool:
+        """Whether the result of the last call made in the current context was served from cache."""
+        return _last_call_stale.get()
+
+    @contextmanager
+    def deadline(self, timeout: float) -> Iterator[Deadline]:
+        """Bound the total time of the calls made in this scope, including calls of nested scopes."""
+        parent = _current_deadline.get()
+        expires_at = time.monotonic() + timeout
+        if parent is not None:
+            expires_at = min(expires_at, parent.expires_at)
+
+        deadline = Deadline(expires_at)
+        token = _current_deadline.set(deadline)
+        try:
+            yield deadline
+        finally:
+            _current_deadline.reset(token)
+            if parent is not None:
+                parent.add_misses(deadline.missed, deadline.stale)
+
+    def call_method(self, bus_name: str, object_path: str, interface: str, method: str, *args: Any,
+                    timeout: Optional[float] = None) -> Any:
+        deadline = _current_deadline.get()
+        timeout = self._get_timeout(method, timeout, deadline)
+        key = (bus_name, str(object_path), interface, method, repr(args))
+        _last_call_stale.set(False)
+
+        try:
+            if timeout is not None and timeout <= 0:
+                raise TransportError(f'Deadline expired before calling {method}', self.NO_REPLY_ERROR)
+            result = self._transport.call_method(bus_name, object_path, interface, method, *args, timeout=timeout)
+        except TransportError as error:
+            if error.name not in self.TIMEOUT_ERRORS:
+                raise
+            return self._handle_miss(key, method, deadline, error)
+
+        if self._stale_fallback and method in self.READ_ONLY_METHODS:
+            with self._lock:
+                self._cache[key] = result
+                self._cache.move_to_end(key)
+                if len(self._cache) > self.MAX_CACHE_SIZE:
+                    self._cache.popitem(last=False)
+
+        return result
+
+    def add_signal_receiver(self, handler: Any, signal_name: str, interface: str, bus_name: Optional[str] = None,
+                            path: Optional[str] = None, path_keyword: Optional[str] = None) -> Any:
+        return self._transport.add_signal_receiver(handler, signal_name, interface, bus_name, path, path_keyword)
+
+    def to_python(self, value: Any) -> Any:
+        return self._transport.to_python(value)
+
+    def close(self) -> None:
+        self._transport.close()
+
+    def get_statistics(self) -> dict[str, dict[str, int]]:
+        with self._lock:
+            return {'deadline_misses': dict(self._misses), 'stale_results': dict(self._stale_results)}
+
+    def _get_timeout(self, method: str, timeout: Optional[float], deadline: Optional[Deadline]) -> Optional[float]:
+        if timeout is None:
+            timeout = self._timeouts.get(method, self._default_timeout)
+        if deadline is not None:
+            remaining = deadline.get_remaining()
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        return timeout
+
+    def _handle_miss(self, key: tuple[Any, ...], method: str, deadline: Optional[Deadline],
+                     error: TransportError) -> Any:
+        with self._lock:
+            self._misses[method] += 1
+            has_cached = self._stale_fallback and key in self._cache
+            if has_cached:
+                self._stale_results[method] += 1
+                result = self._cache[key]
+
+        if deadline is not None:
+            deadline.add_misses(1, has_cached)
+
+        if not has_cached:
+            raise error
+
+        log.warning('Deadline missed, using last known result', method=method, path=key[1])
+        _last_call_stale.set(True)
+        return result
@@ -0,0 +1,159 @@
+# SPDX-FileCopyrightText: 2024 Ferenc Nandor Janky <ferenj@effective-range.com>
+# SPDX-FileCopyrightText: 2024 Attila Gombos <attila.gombos@effective-range.com>
+# SPDX-License-Identifier: MIT
+
+from collections import defaultdict
+from threading import RLock
+from typing import Any, Optional
+
+from context_logger import get_logger
+
+from .systemd import Systemd
+
+log = get_logger('DependencyIndex')
+
+
+class DependencyIndex(object):
+    """In-memory graph of unit dependencies with forward and reverse edges."""
+
+    REVERSE_DEPENDENCIES = {
+        'Requires': 'RequiredBy',
+        'Requisite': 'RequisiteOf',
+        'Wants': 'WantedBy',
+        'BindsTo': 'BoundBy',
+        'PartOf': 'ConsistsOf'
+    }
+    DEPENDENCY_PROPERTIES = list(REVERSE_DEPENDENCIES)
+    # Reverse dependencies that propagate stop and restart jobs to the dependent unit
+    IMPACT_DEPENDENCIES = ['RequiredBy', 'RequisiteOf', 'BoundBy', 'ConsistsOf']
+
+    def __init__(self, systemd: Systemd) -> None:
+        self._systemd = systemd
+        self._edges: dict[str, dict[str, set[str]]] = defaultdict(lambda: defaultdict(set))
+        self._lock = RLock()
+        self._signal_matches: list[Any] = []
+        self._subscribed = False
+
+    def __enter__(self) -> 'DependencyIndex':
+        if not self.build() or not self.watch():
+            raise RuntimeError('Failed to build and watch dependency index')
+        return self
+
+    def __exit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        self.close()
+
+    def build(self) -> bool:
+        units_properties = self._systemd.get_units_properties(self.DEPENDENCY_PROPERTIES)
+
+        if units_properties is None:
+            log.error('Failed to build dependency index')
+            return False
+
+        with self._lock:
+            self._edges.clear()
+            for unit_name, properties in units_properties.items():
+                self._add_unit(unit_name, properties)
+
+        log.info('Built dependency index', units=len(units_properties))
+        return True
+
+    def watch(self) -> bool:
+        handlers = {
+            'UnitNew': self._on_unit_new,
+            'UnitRemoved': self._on_unit_removed,
+            'Reloading': self._on_reloading
+        }
+
+        for signal_name, handler in handlers.items():
+            signal_match = self._systemd.add_manager_signal_handler(signal_name, handler)
+            if signal_match is None:
+                self.close()
+                return False
+            self._signal_matches.append(signal_match)
+
+        # The manager only sends unit signals while at least one client is subscribed
+        if not self._subscribed and not self._systemd.subscribe_to_property_changes():
+            self.close()
+            return False
+        self._subscribed = True
+
+        return True
+
+    def close(self) -> None:
+        for signal_match in self._signal_matches:
+            signal_match.remove()
+        self._signal_matches.clear()
+
+        if self._subscribed:
+            self._systemd.unsubscribe_from_property_changes()
+            self._subscribed = False
+
+    def get_unit_names(self) -> list[str]:
+        with self._lock:
+            return list(self._edges)
+
+    def get_dependencies(self, unit_name: str, dependency_type: str) -> set[str]:
+        with self._lock:
+            if unit_name not in self._edges:
+                return set()
+            return set(self._edges[unit_name].get(dependency_type, set()))
+
+    def get_impacted_units(self, unit_name: str, dependency_types: Optional[list[str]] = None) -> set[str]:
+        dependency_types = dependency_types or self.IMPACT_DEPENDENCIES
+        impacted: set[str] = set()
+        pending = [unit_name]
+
+        with self._lock:
+            while pending:
+                current = pending.pop()
+                if current not in self._edges:
+                    continue
+                for dependency_type in dependency_types:
+                    for dependent in self._edges[current].get(dependency_type, set()):
+                        if dependent != unit_name and dependent not in impacted:
+                            impacted.add(dependent)
+                            pending.append(dependent)
+
+        return impacted
+
+    def _add_unit(self, unit_name: str, properties: dict[str, Any]) -> None:
+        edges = self._edges[unit_name]
+        for dependency_type, reverse_type in self.REVERSE_DEPENDENCIES.items():
+            for dependency in properties.get(dependency_type, []):
+                edges[dependency_type].add(dependency)
+                self._edges[dependency][reverse_type].add(unit_name)
+
+    def _remove_unit(self, unit_name: str) -> None:
+        edges = self._edges.get(unit_name)
+        if edges is None:
+            return
+
+        for dependency_type, reverse_type in self.REVERSE_DEPENDENCIES.items():
+            for dependency in edges.pop(dependency_type, set()):
+                reverse_edges = self._edges[dependency][reverse_type]
+                reverse_edges.discard(unit_name)
+                if not reverse_edges:
+                    del self._edges[dependency][reverse_type]
+                if not self._edges[dependency]:
+                    del self._edges[dependency]
+
+        # Reverse edges are kept, they are defined by the units depending on this one
+        if not any(edges.values()):
+            self._edges.pop(unit_name, None)
+
+    def _on_unit_new(self, unit_name: str, unit_path: str) -> None:
+        units_properties = self._systemd.get_units_properties(self.DEPENDENCY_PROPERTIES, [str(unit_name)])
+
+        with self._lock:
+            self._remove_unit(str(unit_name))
+            for name, properties in (units_properties or {}).items():
+                self._add_unit(name, properties)
+
+    def _on_unit_removed(self, unit_name: str, unit_path: str) -> None:
+        with self._lock:
+            self._remove_unit(str(unit_name))
+
+    def _on_reloading(self, active: bool) -> None:
+        # Unit files could have changed, rebuild when the reload has finished
+        if not active:
+            self.build()
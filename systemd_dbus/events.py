@@ -0,0 +1,151 @@
+# SPDX-FileCopyrightText: 2024 Ferenc Nandor Janky <ferenj@effective-range.com>
+# SPDX-FileCopyrightText: 2024 Attila Gombos <attila.gombos@effective-range.com>
+# SPDX-License-Identifier: MIT
+
+from collections import deque
+from dataclasses import dataclass, field
+from threading import Condition
+from typing import Any, Optional, Iterator, AsyncIterator, TYPE_CHECKING
+
+from context_logger import get_logger
+
+if TYPE_CHECKING:
+    import asyncio
+
+log = get_logger('UnitEventStream')
+
+
+@dataclass(frozen=True)
+class UnitEvent(object):
+    """Property change of a unit, with values converted to plain Python types."""
+    unit_name: str
+    interface: str
+    changed: dict[str, Any] = field(default_factory=dict)
+    timestamp: float = 0.0
+    manager: Optional[str] = None
+    invalidated: list[str] = field(default_factory=list)
+
+
+class UnitEventStream(object):
+    """Bounded buffer of unit events, consumed as a sync or async iterator."""
+
+    DROP_OLDEST = 'drop-oldest'
+    BLOCK = 'block'
+    POLICIES = [DROP_OLDEST, BLOCK]
+
+    def __init__(self, max_size: int = 1024, policy: str = DROP_OLDEST) -> None:
+        if policy not in self.POLICIES:
+            raise ValueError(f'Unknown policy: {policy}, expected one of {self.POLICIES}')
+        if max_size < 1:
+            raise ValueError(f'Invalid max size: {max_size}')
+        self._max_size = max_size
+        self._policy = policy
+        self._events: deque[UnitEvent] = deque()
+        self._condition = Condition()
+        self._signal_matches: list[Any] = []
+        self._async_waiters: list[tuple['asyncio.AbstractEventLoop', 'asyncio.Event']] = []
+        self._closed = False
+        self._dropped = 0
+
+    def __enter__(self) -> 'UnitEventStream':
+        return self
+
+    def __exit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        self.close()
+
+    def __iter__(self) -> Iterator[UnitEvent]:
+        while True:
+            event = self.get()
+            if event is None:
+                return
+            yield event
+
+    def __aiter__(self) -> AsyncIterator[UnitEvent]:
+        return self._iterate_async()
+
+    @property
+    def dropped(self) -> int:
+        return self._dropped
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def add_signal_match(self, signal_match: Any) -> None:
+        self._signal_matches.append(signal_match)
+
+    def put(self, event: UnitEvent) -> bool:
+        with self._condition:
+            if self._closed:
+                return False
+
+            if len(self._events) >= self._max_size:
+                if self._policy == self.DROP_OLDEST:
+                    self._events.popleft()
+                    self._dropped += 1
+                else:
+                    self._condition.wait_for(lambda: self._closed or len(self._events) < self._max_size)
+                    if self._closed:
+                        return False
+
+            self._events.append(event)
+            self._condition.notify_all()
+            self._wake_async_waiters()
+            return True
+
+    def get(self, timeout: Optional[float] = None) -> Optional[UnitEvent]:
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._closed or self._events, timeout):
+                return None
+            if not self._events:
+                return None
+            event = self._events.popleft()
+            self._condition.notify_all()
+            return event
+
+    def close(self) -> None:
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+            self._wake_async_waiters()
+
+        for signal_match in self._signal_matches:
+            signal_match.remove()
+        self._signal_matches.clear()
+
+        if self._dropped:
+            log.warning('Dropped events due to full buffer', dropped=self._dropped)
+
+    async def _iterate_async(self) -> AsyncIterator[UnitEvent]:
+        import asyncio
+
+        # Events stay in the bounded buffer until the consumer takes them in the loop thread,
+        # so a cancelled consumer never loses an event
+        wakeup = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), wakeup)
+        with self._condition:
+            self._async_waiters.append(waiter)
+
+        try:
+            while True:
+                wakeup.clear()
+                event = self.get(0)
+                if event is not None:
+                    yield event
+                elif self._closed:
+                    return
+                else:
+                    await wakeup.wait()
+        finally:
+            with self._condition:
+                self._async_waiters.remove(waiter)
+
+    def _wake_async_waiters(self) -> None:
+        for loop, wakeup in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:
+                # Event loop of an abandoned consumer is already closed
+                pass
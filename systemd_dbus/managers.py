@@ -0,0 +1,217 @@
+# SPDX-FileCopyrightText: 2024 Ferenc Nandor Janky <ferenj@effective-range.com>
+# SPDX-FileCopyrightText: 2024 Attila Gombos <attila.gombos@effective-range.com>
+# SPDX-License-Identifier: MIT
+
+import os
+from dataclasses import dataclass, field
+from threading import RLock, Thread, Event
+from typing import Any, Optional, Callable
+
+from context_logger import get_logger
+
+from .events import UnitEventStream
+from .reconciler import UnitStatus
+from .systemd import Systemd, SystemdDbus, map_concurrently
+from .transport import Transport, create_transport
+
+log = get_logger('SystemdManagers')
+
+
+@dataclass
+class _MergedStream(object):
+    stream: UnitEventStream
+    unit_names: Optional[list[str]]
+    managers: set[str] = field(default_factory=set)
+
+
+class SystemdManagers(object):
+    """System manager and per-user managers of the active user sessions, queried concurrently."""
+
+    SYSTEM_MANAGER = 'system'
+    USER_MANAGER_PREFIX = 'user@'
+    RUNTIME_DIRECTORY = '/run/user'
+    BUS_SOCKET_NAME = 'bus'
+    DISCOVERY_INTERVAL = 5.0
+
+    def __init__(self, system_transport: Optional[Transport] = None, runtime_directory: str = RUNTIME_DIRECTORY,
+                 transport_factory: Optional[Callable[[str], Transport]] = None, max_workers: int = 8,
+                 discovery_interval: float = DISCOVERY_INTERVAL) -> None:
+        self._runtime_directory = runtime_directory
+        self._transport_factory = transport_factory or (lambda address: create_transport('socket', address=address))
+        self._max_workers = max_workers
+        self._discovery_interval = discovery_interval
+        # Signals of the socket transport are dispatched on its own thread, without a main loop of the application
+        self._owns_system_transport = system_transport is None
+        self._system_transport = system_transport or create_transport('socket')
+        self._managers: dict[str, Systemd] = {
+            self.SYSTEM_MANAGER: SystemdDbus(transport=self._system_transport, max_workers=max_workers,
+                                             manager_name=self.SYSTEM_MANAGER)
+        }
+        self._user_transports: dict[str, Transport] = {}
+        self._streams: list[_MergedStream] = []
+        self._subscribed: set[str] = set()
+        self._lock = RLock()
+        self._stop_event = Event()
+        self._discovery: Optional[Thread] = None
+
+    def __enter__(self) -> 'SystemdManagers':
+        self.start()
+        return self
+
+    def __exit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        self.close()
+
+    def start(self) -> None:
+        """Connect to the user managers of the current sessions, and keep discovering sessions in the background."""
+        self.refresh()
+
+        if self._discovery is None and self._discovery_interval > 0:
+            self._stop_event.clear()
+            self._discovery = Thread(target=self._discover_sessions, daemon=True)
+            self._discovery.start()
+
+    def close(self) -> None:
+        self._stop_event.set()
+        if self._discovery is not None:
+            self._discovery.join()
+            self._discovery = None
+
+        with self._lock:
+            streams, self._streams = self._streams, []
+            subscribed = [(manager_name, self._managers[manager_name]) for manager_name in self._subscribed
+                          if manager_name in self._managers]
+            self._subscribed.clear()
+
+        for merged in streams:
+            merged.stream.close()
+
+        for manager_name, systemd in subscribed:
+            systemd.unsubscribe_from_property_changes()
+
+        with self._lock:
+            transports = [self._remove_user_manager(manager_name) for manager_name in list(self._user_transports)]
+
+        for manager_name, transport in transports:
+            self._close_transport(manager_name, transport)
+
+        if self._owns_system_transport:
+            self._close_transport(self.SYSTEM_MANAGER, self._system_transport)
+
+    def refresh(self) -> bool:
+        """Add the managers of new sessions and remove the ones of ended sessions, returns whether any changed."""
+        current = self._find_user_buses()
+
+        with self._lock:
+            removed = [self._remove_user_manager(manager_name) for manager_name in list(self._user_transports)
+                       if manager_name not in current]
+            added = [self._add_user_manager(manager_name, address) for manager_name, address in current.items()
+                     if manager_name not in self._managers]
+            streams = [merged for merged in self._streams if not merged.stream.closed]
+
+        for manager_name, transport in removed:
+            self._close_transport(manager_name, transport)
+
+        for manager_name, systemd in added:
+            for merged in streams:
+                self._add_to_stream(manager_name, systemd, merged)
+
+        return bool(added or removed)
+
+    def get_manager_names(self) -> list[str]:
+        with self._lock:
+            return list(self._managers)
+
+    def get_manager(self, manager_name: str) -> Optional[Systemd]:
+        with self._lock:
+            return self._managers.get(manager_name)
+
+    def get_units_properties(self, property_names: list[str], unit_names: Optional[list[str]] = None,
+                             interface: Optional[str] = None) -> dict[str, dict[str, dict[str, Any]]]:
+        """Properties of the units of each manager, managers that fail to respond are left out."""
+        return self._query_managers(lambda systemd: systemd.get_units_properties(property_names, unit_names,
+                                                                                 interface))
+
+    def get_unit_states(self, unit_names: list[str]) -> dict[str, dict[str, UnitStatus]]:
+        return self._query_managers(lambda systemd: systemd.get_unit_states(unit_names))
+
+    def stream_unit_events(self, unit_names: Optional[list[str]] = None, max_size: int = 1024,
+                           policy: str = UnitEventStream.DROP_OLDEST) -> UnitEventStream:
+        """Events of all managers in one stream, tagged by manager, including managers of sessions started later."""
+        merged = _MergedStream(UnitEventStream(max_size, policy), unit_names)
+
+        with self._lock:
+            self._streams = [open_stream for open_stream in self._streams if not open_stream.stream.closed]
+            self._streams.append(merged)
+            managers = dict(self._managers)
+
+        for manager_name, systemd in managers.items():
+            self._add_to_stream(manager_name, systemd, merged)
+
+        return merged.stream
+
+    def _query_managers(self, function: Callable[[Systemd], Any]) -> dict[str, Any]:
+        with self._lock:
+            managers = list(self._managers.items())
+
+        results = map_concurrently(function, [systemd for _, systemd in managers], self._max_workers)
+
+        return {manager_name: result for (manager_name, _), result in zip(managers, results) if result is not None}
+
+    def _find_user_buses(self) -> dict[str, str]:
+        try:
+            entries = os.listdir(self._runtime_directory)
+        except OSError as error:
+            log.warning('Failed to list user runtime directories', directory=self._runtime_directory, reason=error)
+            return {}
+
+        user_buses = {}
+        for entry in entries:
+            bus_path = os.path.join(self._runtime_directory, entry, self.BUS_SOCKET_NAME)
+            if entry.isdigit() and os.path.exists(bus_path):
+                user_buses[f'{self.USER_MANAGER_PREFIX}{entry}'] = f'unix:path={bus_path}'
+
+        return user_buses
+
+    def _add_user_manager(self, manager_name: str, address: str) -> tuple[str, Systemd]:
+        transport = self._transport_factory(address)
+        systemd = SystemdDbus(transport=transport, max_workers=self._max_workers, manager_name=manager_name)
+        self._user_transports[manager_name] = transport
+        self._managers[manager_name] = systemd
+        log.info('Added user manager', manager=manager_name, address=address)
+        return manager_name, systemd
+
+    def _remove_user_manager(self, manager_name: str) -> tuple[str, Transport]:
+        self._managers.pop(manager_name, None)
+        self._subscribed.discard(manager_name)
+        log.info('Removed user manager', manager=manager_name)
+        return manager_name, self._user_transports.pop(manager_name)
+
+    def _close_transport(self, manager_name: str, transport: Transport) -> None:
+        try:
+            transport.close()
+        except Exception as error:
+            log.warning('Failed to close manager connection', manager=manager_name, reason=error)
+
+    def _add_to_stream(self, manager_name: str, systemd: Systemd, merged: _MergedStream) -> None:
+        with self._lock:
+            # A session discovered while the stream is being set up must not be added twice
+            if manager_name in merged.managers:
+                return
+            merged.managers.add(manager_name)
+            subscribe = manager_name not in self._subscribed
+            self._subscribed.add(manager_name)
+
+        # Managers only emit unit property changes while at least one client is subscribed
+        if subscribe and not systemd.subscribe_to_property_changes():
+            with self._lock:
+                self._subscribed.discard(manager_name)
+
+        if systemd.stream_unit_events(merged.unit_names, stream=merged.stream) is None:
+            log.warning('Events of manager are not streamed', manager=manager_name)
+
+    def _discover_sessions(self) -> None:
+        while not self._stop_event.wait(self._discovery_interval):
+            try:
+                self.refresh()
+            except Exception as error:
+                log.error('Failed to discover user sessions', reason=error)
@@ -0,0 +1,90 @@
+# SPDX-FileCopyrightText: 2024 Ferenc Nandor Janky <ferenj@effective-range.com>
+# SPDX-FileCopyrightText: 2024 Attila Gombos <attila.gombos@effective-range.com>
+# SPDX-License-Identifier: MIT
+
+from threading import RLock
+from typing import Any, Optional
+
+from context_logger import get_logger
+
+from .transport import Transport, TransportError, SignalReceiver
+
+log = get_logger('InMemoryTransport')
+
+
+class InMemoryTransport(Transport):
+    """Transport without a bus: methods are served by registered callables, signals are emitted by the caller."""
+
+    UNKNOWN_METHOD_ERROR = 'org.freedesktop.DBus.Error.UnknownMethod'
+
+    def __init__(self) -> None:
+        self._methods: dict[tuple[Optional[str], str, str], Any] = {}
+        self._receivers: list[SignalReceiver] = []
+        self._calls: list[tuple[str, str, str, tuple[Any, ...]]] = []
+        self._handler_errors = 0
+        self._lock = RLock()
+
+    @property
+    def calls(self) -> list[tuple[str, str, str, tuple[Any, ...]]]:
+        with self._lock:
+            return list(self._calls)
+
+    @property
+    def handler_errors(self) -> int:
+        """Number of exceptions raised by signal handlers, each one counted for its own receiver."""
+        with self._lock:
+            return self._handler_errors
+
+    def add_method(self, interface: str, method: str, handler: Any, object_path: Optional[str] = None) -> None:
+        """Register a method handler, for all object paths when no path is given."""
+        with self._lock:
+            self._methods[(object_path, interface, method)] = handler
+
+    def call_method(self, bus_name: str, object_path: str, interface: str, method: str, *args: Any,
+                    timeout: Optional[float] = None) -> Any:
+        with self._lock:
+            self._calls.append((object_path, interface, method, args))
+            handler = self._methods.get((object_path, interface, method), self._methods.get((None, interface, method)))
+
+        if handler is None:
+            raise TransportError(f'No method {method} on {interface} at {object_path}', self.UNKNOWN_METHOD_ERROR)
+
+        return handler(*args)
+
+    def add_signal_receiver(self, handler: Any, signal_name: str, interface: str, bus_name: Optional[str] = None,
+                            path: Optional[str] = None, path_keyword: Optional[str] = None) -> Any:
+        receiver = SignalReceiver(handler, signal_name, interface, path, path_keyword, on_remove=self._remove_receiver)
+
+        with self._lock:
+            self._receivers.append(receiver)
+
+        return receiver
+
+    def emit_signal(self, object_path: str, interface: str, signal_name: str, *args: Any) -> int:
+        """Dispatch a signal to the matching receivers in the calling thread, returns the number of receivers.
+
+        A failing handler does not prevent the other receivers from getting the signal, failures are counted
+        in handler_errors.
+        """
+        with self._lock:
+            receivers = [receiver for receiver in self._receivers
+                         if receiver.matches(signal_name, interface, object_path)]
+
+        for receiver in receivers:
+            try:
+                receiver.dispatch(object_path, list(args))
+            except Exception as error:
+                log.error('Signal handler failed', signal=signal_name, path=object_path, reason=error)
+                with self._lock:
+                    self._handler_errors += 1
+
+        return len(receivers)
+
+    def close(self) -> None:
+        with self._lock:
+            self._receivers.clear()
+
+    def _remove_receiver(self, receiver: SignalReceiver) -> None:
+        with self._lock:
+            if receiver in self._receivers:
+                self._receivers.remove(receiver)
@@ -0,0 +1,305 @@
+# SPDX-FileCopyrightText: 2024 Ferenc Nandor Janky <ferenj@effective-range.com>
+# SPDX-FileCopyrightText: 2024 Attila Gombos <attila.gombos@effective-range.com>
+# SPDX-License-Identifier: MIT
+
+import struct
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+METHOD_CALL = 1
+METHOD_RETURN = 2
+ERROR = 3
+SIGNAL = 4
+
+NO_REPLY_EXPECTED = 0x1
+
+HEADER_PATH = 1
+HEADER_INTERFACE = 2
+HEADER_MEMBER = 3
+HEADER_ERROR_NAME = 4
+HEADER_REPLY_SERIAL = 5
+HEADER_DESTINATION = 6
+HEADER_SENDER = 7
+HEADER_SIGNATURE = 8
+
+HEADER_FIELD_SIGNATURES = {
+    HEADER_PATH: 'o',
+    HEADER_INTERFACE: 's',
+    HEADER_MEMBER: 's',
+    HEADER_ERROR_NAME: 's',
+    HEADER_REPLY_SERIAL: 'u',
+    HEADER_DESTINATION: 's',
+    HEADER_SENDER: 's',
+    HEADER_SIGNATURE: 'g'
+}
+
+FIXED_TYPES = {
+    'y': ('B', 1),
+    'b': ('I', 4),
+    'n': ('h', 2),
+    'q': ('H', 2),
+    'i': ('i', 4),
+    'u': ('I', 4),
+    'x': ('q', 8),
+    't': ('Q', 8),
+    'd': ('d', 8),
+    'h': ('I', 4)
+}
+
+ENDIANNESS = {ord('l'): '<', ord('B'): '>'}
+
+# Fixed header, followed by the length of the header field array
+HEADER_PREFIX_SIZE = 16
+
+
+class Variant(object):
+    """Value with explicit signature, for marshalling variants whose type can not be guessed."""
+
+    def __init__(self, signature: str, value: Any) -> None:
+        self.signature = signature
+        self.value = value
+
+
+@dataclass
+class Message(object):
+    message_type: int
+    serial: int = 0
+    path: Optional[str] = None
+    interface: Optional[str] = None
+    member: Optional[str] = None
+    error_name: Optional[str] = None
+    reply_serial: Optional[int] = None
+    destination: Optional[str] = None
+    sender: Optional[str] = None
+    signature: str = ''
+    body: list[Any] = field(default_factory=list)
+    flags: int = 0
+
+    def marshal(self) -> bytes:
+        header_fields = [
+            (HEADER_PATH, self.path),
+            (HEADER_INTERFACE, self.interface),
+            (HEADER_MEMBER, self.member),
+            (HEADER_ERROR_NAME, self.error_name),
+            (HEADER_REPLY_SERIAL, self.reply_serial),
+            (HEADER_DESTINATION, self.destination),
+            (HEADER_SENDER, self.sender),
+            (HEADER_SIGNATURE, self.signature or None)
+        ]
+
+        body = _Writer()
+        for type_signature, value in zip(split_signature(self.signature), self.body):
+            body.write(type_signature, value)
+
+        header = _Writer()
+        header.write('y', ord('l'))
+        header.write('y', self.message_type)
+        header.write('y', self.flags)
+        header.write('y', 1)
+        header.write('u', len(body.buffer))
+        header.write('u', self.serial)
+        header.write('a(yv)', [(code, Variant(HEADER_FIELD_SIGNATURES[code], value))
+                               for code, value in header_fields if value is not None])
+        header.align(8)
+
+        return bytes(header.buffer + body.buffer)
+
+    @staticmethod
+    def get_size(prefix: bytes) -> int:
+        """Total size of the message, based on its first HEADER_PREFIX_SIZE bytes."""
+        endianness = ENDIANNESS[prefix[0]]
+        body_length, _, fields_length = struct.unpack_from(f'{endianness}III', prefix, 4)
+        return _padded(HEADER_PREFIX_SIZE + fields_length, 8) + int(body_length)
+
+    @staticmethod
+    def unmarshal(data: bytes) -> 'Message':
+        reader = _Reader(data, ENDIANNESS[data[0]])
+        _, message_type, flags, _ = (reader.read('y') for _ in range(4))
+        reader.read('u')
+        serial = reader.read('u')
+        fields = dict(reader.read('a(yv)'))
+        reader.align(8)
+
+        signature = fields.get(HEADER_SIGNATURE, '')
+        body = [reader.read(type_signature) for type_signature in split_signature(signature)]
+
+        return Message(message_type, serial, fields.get(HEADER_PATH), fields.get(HEADER_INTERFACE),
+                       fields.get(HEADER_MEMBER), fields.get(HEADER_ERROR_NAME), fields.get(HEADER_REPLY_SERIAL),
+                       fields.get(HEADER_DESTINATION), fields.get(HEADER_SENDER), signature, body, flags)
+
+
+def split_signature(signature: str) -> list[str]:
+    """Split a signature into its single complete types."""
+    types = []
+    index = 0
+
+    while index < len(signature):
+        end = _get_type_end(signature, index)
+        types.append(signature[index:end])
+        index = end
+
+    return types
+
+
+def guess_signature(value: Any) -> str:
+    if isinstance(value, Variant):
+        return 'v'
+    if isinstance(value, bool):
+        return 'b'
+    if isinstance(value, int):
+        return 'i'
+    if isinstance(value, float):
+        return 'd'
+    if isinstance(value, str):
+        return 's'
+    if isinstance(value, bytes):
+        return 'ay'
+    if isinstance(value, tuple):
+        return f'({"".join(guess_signature(item) for item in value)})'
+    if isinstance(value, list):
+        return f'a{guess_signature(value[0])}' if value else 'as'
+    if isinstance(value, dict):
+        return 'a{sv}'
+    raise ValueError(f'Can not guess signature of {type(value).__name__}')
+
+
+def _get_type_end(signature: str, index: int) -> int:
+    code = signature[index]
+
+    if code == 'a':
+        return _get_type_end(signature, index + 1)
+
+    if code in '({':
+        closing = ')' if code == '(' else '}'
+        index += 1
+        while signature[index] != closing:
+            index = _get_type_end(signature, index)
+        return index + 1
+
+    if code not in FIXED_TYPES and code not in 'sogv':
+        raise ValueError(f'Invalid signature: {signature}')
+
+    return index + 1
+
+
+def _get_alignment(type_signature: str) -> int:
+    code = type_signature[0]
+    if code in FIXED_TYPES:
+        return FIXED_TYPES[code][1]
+    if code in '({':
+        return 8
+    if code in 'aso':
+        return 4
+    return 1
+
+
+def _padded(offset: int, alignment: int) -> int:
+    return offset + (-offset % alignment)
+
+
+class _Writer(object):
+
+    def __init__(self) -> None:
+        self.buffer = bytearray()
+
+    def align(self, alignment: int) -> None:
+        self.buffer.extend(b'\0' * (-len(self.buffer) % alignment))
+
+    def write(self, type_signature: str, value: Any) -> None:
+        code = type_signature[0]
+
+        if code in FIXED_TYPES:
+            fmt, size = FIXED_TYPES[code]
+            self.align(size)
+            self.buffer.extend(struct.pack(f'<{fmt}', int(value) if code != 'd' else float(value)))
+        elif code in 'so':
+            encoded = str(value).encode()
+            self.write('u', len(encoded))
+            self.buffer.extend(encoded + b'\0')
+        elif code == 'g':
+            encoded = str(value).encode()
+            self.buffer.extend(bytes([len(encoded)]) + encoded + b'\0')
+        elif code == 'v':
+            variant = value if isinstance(value, Variant) else Variant(guess_signature(value), value)
+            self.write('g', variant.signature)
+            self.write(variant.signature, variant.value)
+        elif code == 'a':
+            self._write_array(type_signature[1:], value)
+        else:
+            self.align(8)
+            for item_signature, item in zip(split_signature(type_signature[1:-1]), value):
+                self.write(item_signature, item)
+
+    def _write_array(self, item_signature: str, value: Any) -> None:
+        self.align(4)
+        length_offset = len(self.buffer)
+        self.buffer.extend(b'\0\0\0\0')
+        self.align(_get_alignment(item_signature))
+        start = len(self.buffer)
+
+        if item_signature[0] == '{':
+            items = list(value.items())
+        elif item_signature == 'y':
+            items = list(bytes(value))
+        else:
+            items = list(value)
+
+        for item in items:
+            self.write(item_signature, item)
+
+        struct.pack_into('<I', self.buffer, length_offset, len(self.buffer) - start)
+
+
+class _Reader(object):
+
+    def __init__(self, data: bytes, endianness: str) -> None:
+        self._data = data
+        self._endianness = endianness
+        self._offset = 0
+
+    def align(self, alignment: int) -> None:
+        self._offset = _padded(self._offset, alignment)
+
+    def read(self, type_signature: str) -> Any:
+        code = type_signature[0]
+
+        if code in FIXED_TYPES:
+            fmt, size = FIXED_TYPES[code]
+            self.align(size)
+            value = struct.unpack_from(f'{self._endianness}{fmt}', self._data, self._offset)[0]
+            self._offset += size
+            return bool(value) if code == 'b' else value
+        elif code in 'so':
+            length = self.read('u')
+            return self._read_string(length)
+        elif code == 'g':
+            length = self._data[self._offset]
+            self._offset += 1
+            return self._read_string(length)
+        elif code == 'v':
+            return self.read(self.read('g'))
+        elif code == 'a':
+            return self._read_array(type_signature[1:])
+        else:
+            self.align(8)
+            return tuple(self.read(item_signature) for item_signature in split_signature(type_signature[1:-1]))
+
+    def _read_string(self, length: int) -> str:
+        value = self._data[self._offset:self._offset + length].decode()
+        self._offset += length + 1
+        return value
+
+    def _read_array(self, item_signature: str) -> Any:
+        length = self.read('u')
+        self.align(_get_alignment(item_signature))
+        end = self._offset + length
+
+        if item_signature == 'y':
+            self._offset = end
+            return bytes(self._data[end - length:end])
+
+        items = []
+        while self._offset < end:
+            items.append(self.read(item_signature))
+
+        return dict(items) if item_signature[0] == '{' else items
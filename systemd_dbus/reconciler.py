@@ -0,0 +1,145 @@
+# SPDX-FileCopyrightText: 2024 Ferenc Nandor Janky <ferenj@effective-range.com>
+# SPDX-FileCopyrightText: 2024 Attila Gombos <attila.gombos@effective-range.com>
+# SPDX-License-Identifier: MIT
+
+from dataclasses import dataclass, field
+from typing import Optional
+
+ENABLED_FILE_STATES = ['enabled', 'static']
+MASKED_FILE_STATES = ['masked', 'masked-runtime']
+RUNNING_ACTIVE_STATES = ['active', 'activating', 'reloading']
+
+
+@dataclass
+class UnitState(object):
+    """Desired state of a unit, None means 'do not care'."""
+    enabled: Optional[bool] = None
+    masked: Optional[bool] = None
+    active: Optional[bool] = None
+
+
+@dataclass
+class UnitStatus(object):
+    """Current state of a unit as read from the service manager."""
+    name: str
+    load_state: str = 'not-found'
+    active_state: str = 'inactive'
+    sub_state: str = 'dead'
+    file_state: Optional[str] = None
+    job_id: int = 0
+    object_path: Optional[str] = None
+
+    @property
+    def is_enabled(self) -> bool:
+        return self.file_state in ENABLED_FILE_STATES
+
+    @property
+    def is_masked(self) -> bool:
+        return self.file_state in MASKED_FILE_STATES
+
+    @property
+    def is_running(self) -> bool:
+        return self.active_state in RUNNING_ACTIVE_STATES
+
+    @property
+    def is_installed(self) -> bool:
+        return self.load_state != 'not-found' or self.file_state is not None
+
+
+@dataclass
+class UnitReport(object):
+    """Outcome of reconciling a single unit."""
+    name: str
+    actions: list[str] = field(default_factory=list)
+    success: bool = True
+    error: Optional[str] = None
+
+    def fail(self, error: str) -> None:
+        self.success = False
+        self.error = error if self.error is None else f'{self.error}; {error}'
+
+
+@dataclass
+class ReconcilePlan(object):
+    """Minimal set of operations that bring the current state to the desired state."""
+    unmask: list[str] = field(default_factory=list)
+    disable: list[str] = field(default_factory=list)
+    enable: list[str] = field(default_factory=list)
+    mask: list[str] = field(default_factory=list)
+    stop: list[str] = field(default_factory=list)
+    start: list[str] = field(default_factory=list)
+    reports: dict[str, UnitReport] = field(default_factory=dict)
+
+    # Unit file operations in the order they have to be applied
+    FILE_OPERATIONS = ['unmask', 'disable', 'enable', 'mask']
+    # Job operations in the order they have to be queued
+    JOB_OPERATIONS = ['stop', 'start']
+
+    def file_operations(self) -> list[tuple[str, list[str]]]:
+        return [(operation, getattr(self, operation)) for operation in self.FILE_OPERATIONS
+                if getattr(self, operation)]
+
+    def job_operations(self) -> list[tuple[str, list[str]]]:
+        return [(operation, getattr(self, operation)) for operation in self.JOB_OPERATIONS
+                if getattr(self, operation)]
+
+    def is_empty(self) -> bool:
+        return not self.file_operations() and not self.job_operations()
+
+
+def plan_reconciliation(desired_state: dict[str, UnitState], current_state: dict[str, UnitStatus]) -> ReconcilePlan:
+    plan = ReconcilePlan()
+
+    for name, desired in desired_state.items():
+        current = current_state.get(name, UnitStatus(name))
+        report = plan.reports[name] = UnitReport(name)
+
+        for operation in _plan_unit(desired, current, report):
+            getattr(plan, operation).append(name)
+            report.actions.append(operation)
+
+    return plan
+
+
+def _plan_unit(desired: UnitState, current: UnitStatus, report: UnitReport) -> list[str]:
+    operations, masked = _plan_mask(desired, current)
+    operations += _plan_enable(desired, current, masked, report)
+    operations += _plan_active(desired, current, masked, report)
+
+    if operations and not current.is_installed and operations != ['mask']:
+        report.fail('unit not found')
+
+    if not report.success:
+        return []
+
+    return operations
+
+
+def _plan_mask(desired: UnitState, current: UnitStatus) -> tuple[list[str], bool]:
+    if desired.masked is True and not current.is_masked:
+        return ['mask'], True
+    if desired.masked is False and current.is_masked:
+        return ['unmask'], False
+    return [], current.is_masked
+
+
+def _plan_enable(desired: UnitState, current: UnitStatus, masked: bool, report: UnitReport) -> list[str]:
+    if desired.enabled is True and not current.is_enabled:
+        if masked:
+            report.fail('cannot enable masked unit')
+            return []
+        return ['enable']
+    if desired.enabled is False and current.file_state == 'enabled':
+        return ['disable']
+    return []
+
+
+def _plan_active(desired: UnitState, current: UnitStatus, masked: bool, report: UnitReport) -> list[str]:
+    if desired.active is True and not current.is_running:
+        if masked:
+            report.fail('cannot start masked unit')
+            return []
+        return ['start']
+    if desired.active is False and current.is_running:
+        return ['stop']
+    return []
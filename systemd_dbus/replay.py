@@ -0,0 +1,198 @@
+# SPDX-FileCopyrightText: 2024 Ferenc Nandor Janky <ferenj@effective-range.com>
+# SPDX-FileCopyrightText: 2024 Attila Gombos <attila.gombos@effective-range.com>
+# SPDX-License-Identifier: MIT
+
+import math
+import struct
+import time
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, Optional, Iterator, BinaryIO, TYPE_CHECKING
+
+from context_logger import get_logger
+
+from .codec import encode_value, decode_value
+from .systemd import SystemdDbus
+from .transport import Transport, TransportError
+
+if TYPE_CHECKING:
+    from .memory_transport import InMemoryTransport
+
+log = get_logger('SignalReplay')
+
+RECORDING_MAGIC = b'SDREC'
+RECORDING_VERSION = 1
+
+_HEADER = struct.Struct('<5sH')
+_U32 = struct.Struct('<I')
+
+
+@dataclass(frozen=True)
+class RecordedSignal(object):
+    """Signal with its arrival time relative to the start of the recording."""
+    offset: float
+    path: str
+    interface: str
+    signal_name: str
+    args: tuple[Any, ...] = ()
+
+
+@dataclass
+class ReplayReport(object):
+    signals: int = 0
+    handler_calls: int = 0
+    errors: int = 0
+    duration: float = 0.0
+    latencies: list[float] = field(default_factory=list, repr=False)
+
+    @property
+    def throughput(self) -> float:
+        return self.signals / self.duration if self.duration > 0 else 0.0
+
+    def get_latency(self, percentile: float) -> float:
+        """Handler latency of a signal at the given percentile (0-100), nearest rank."""
+        if not self.latencies:
+            return 0.0
+        latencies = sorted(self.latencies)
+        rank = min(len(latencies), max(1, math.ceil(percentile / 100 * len(latencies))))
+        return latencies[rank - 1]
+
+    def get_latency_percentiles(self) -> dict[str, float]:
+        return {'p50': self.get_latency(50), 'p90': self.get_latency(90), 'p99': self.get_latency(99),
+                'max': self.get_latency(100)}
+
+
+class SignalRecorder(object):
+    """Records systemd signals with their arrival time into a file."""
+
+    SIGNALS = [
+        (SystemdDbus.DBUS_PROPERTIES_INTERFACE, 'PropertiesChanged'),
+        (SystemdDbus.SYSTEMD_MANAGER_INTERFACE, 'JobRemoved'),
+        (SystemdDbus.SYSTEMD_MANAGER_INTERFACE, 'UnitNew')
+    ]
+
+    def __init__(self, transport: Transport, path: str, signals: Optional[list[tuple[str, str]]] = None) -> None:
+        self._transport = transport
+        self._path = path
+        self._signals = signals or self.SIGNALS
+        self._signal_matches: list[Any] = []
+        self._file: Optional[BinaryIO] = None
+        self._started_at = 0.0
+        self._count = 0
+        self._lock = Lock()
+
+    def __enter__(self) -> 'SignalRecorder':
+        self.start()
+        return self
+
+    def __exit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        self.stop()
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def start(self) -> bool:
+        with self._lock:
+            self._file = open(self._path, 'wb')
+            self._file.write(_HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION))
+            self._started_at = time.monotonic()
+            self._count = 0
+
+        try:
+            for interface, signal_name in self._signals:
+                self._signal_matches.append(self._transport.add_signal_receiver(
+                    self._create_handler(interface, signal_name), signal_name, interface,
+                    SystemdDbus.SYSTEMD_BUS_NAME, path_keyword='path'))
+        except TransportError as error:
+            log.error('Failed to start recording signals', path=self._path, reason=error)
+            self.stop()
+            return False
+
+        self._subscribe('Subscribe')
+        log.info('Started recording signals', path=self._path)
+        return True
+
+    def stop(self) -> None:
+        if self._signal_matches:
+            self._subscribe('Unsubscribe')
+
+        for signal_match in self._signal_matches:
+            signal_match.remove()
+        self._signal_matches.clear()
+
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                log.info('Stopped recording signals', path=self._path, signals=self._count)
+
+    def _subscribe(self, method: str) -> None:
+        # Without a subscribed client the manager does not emit job and unit signals
+        try:
+            self._transport.call_method(SystemdDbus.SYSTEMD_BUS_NAME, SystemdDbus.SYSTEMD_OBJECT_PATH,
+                                        SystemdDbus.SYSTEMD_MANAGER_INTERFACE, method)
+        except TransportError as error:
+            log.warning('Failed to call manager', method=method, reason=error)
+
+    def _create_handler(self, interface: str, signal_name: str) -> Any:
+        def handler(*args: Any, path: str) -> None:
+            offset = time.monotonic() - self._started_at
+            record = encode_value((offset, str(path), interface, signal_name,
+                                   tuple(self._transport.to_python(arg) for arg in args)))
+            with self._lock:
+                if self._file is not None:
+                    self._file.write(_U32.pack(len(record)) + record)
+                    self._count += 1
+
+        return handler
+
+
+def read_signals(path: str) -> Iterator[RecordedSignal]:
+    with open(path, 'rb') as file:
+        header = file.read(_HEADER.size)
+        if len(header) < _HEADER.size or _HEADER.unpack(header) != (RECORDING_MAGIC, RECORDING_VERSION):
+            raise ValueError(f'Not a signal recording: {path}')
+
+        while len(prefix := file.read(_U32.size)) == _U32.size:
+            record = file.read(_U32.unpack(prefix)[0])
+            offset, object_path, interface, signal_name, args = decode_value(record, 0)[0]
+            yield RecordedSignal(offset, object_path, interface, signal_name, tuple(args))
+
+
+class SignalReplayer(object):
+    """Feeds recorded signals to the handlers registered on an in-memory transport, measuring their latency."""
+
+    def __init__(self, path: str) -> None:
+        self._signals = list(read_signals(path))
+
+    @property
+    def signals(self) -> list[RecordedSignal]:
+        return self._signals
+
+    def replay(self, transport: 'InMemoryTransport', speed: Optional[float] = 1.0) -> ReplayReport:
+        """Replay with the recorded timing scaled by speed, or as fast as possible when speed is None."""
+        if speed is not None and speed <= 0:
+            raise ValueError(f'Invalid speed: {speed}')
+
+        report = ReplayReport()
+        started_at = time.monotonic()
+
+        for signal in self._signals:
+            if speed is not None:
+                delay = started_at + signal.offset / speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+            errors = transport.handler_errors
+            dispatched_at = time.perf_counter()
+            report.handler_calls += transport.emit_signal(signal.path, signal.interface, signal.signal_name,
+                                                          *signal.args)
+            report.latencies.append(time.perf_counter() - dispatched_at)
+            report.errors += transport.handler_errors - errors
+            report.signals += 1
+
+        report.duration = time.monotonic() - started_at
+        log.info('Replayed signals', signals=report.signals, throughput=round(report.throughput, 1),
+                 **report.get_latency_percentiles())
+        return report
@@ -0,0 +1,298 @@
+# SPDX-FileCopyrightText: 2024 Ferenc Nandor Janky <ferenj@effective-range.com>
+# SPDX-FileCopyrightText: 2024 Attila Gombos <attila.gombos@effective-range.com>
+# SPDX-License-Identifier: MIT
+
+import mmap
+import os
+import struct
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional, BinaryIO
+
+from context_logger import get_logger
+
+from .codec import MISSING_TAG, encode_value, decode_value
+from .events import UnitEventStream
+from .systemd import Systemd
+
+log = get_logger('Snapshot')
+
+SNAPSHOT_MAGIC = b'SDSNAP'
+SNAPSHOT_VERSION = 1
+FULL_SNAPSHOT = 0
+DELTA_SNAPSHOT = 1
+
+# Magic, version, kind, timestamp, number of units, number of columns
+_HEADER = struct.Struct('<6sHBxd2I')
+_U32 = struct.Struct('<I')
+_U64 = struct.Struct('<Q')
+
+
+@dataclass
+class SnapshotDiff(object):
+    added_units: list[str] = field(default_factory=list)
+    removed_units: list[str] = field(default_factory=list)
+    changed: dict[str, dict[str, tuple[Any, Any]]] = field(default_factory=dict)
+
+    def is_empty(self) -> bool:
+        return not self.added_units and not self.removed_units and not self.changed
+
+
+def write_snapshot(path: str, units: dict[str, dict[str, Any]], properties: list[str],
+                   timestamp: Optional[float] = None, delta: bool = False) -> None:
+    """Write unit properties column by column, each value prefixed with a type tag."""
+    unit_names = list(units)
+    timestamp = time.time() if timestamp is None else timestamp
+
+    with open(f'{path}.tmp', 'wb') as file:
+        file.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, DELTA_SNAPSHOT if delta else FULL_SNAPSHOT,
+                                timestamp, len(unit_names), len(properties)))
+        for name in unit_names + properties:
+            _write_string(file, name)
+
+        columns_offset = file.tell()
+        file.write(b'\0' * _U64.size * len(properties))
+
+        column_offsets = []
+        for property_name in properties:
+            column_offsets.append(file.tell())
+            values = [encode_value(units[unit_name].get(property_name)) for unit_name in unit_names]
+            value_offset = 0
+            for value in values:
+                file.write(_U32.pack(value_offset))
+                value_offset += len(value)
+            file.write(_U32.pack(value_offset))
+            file.write(b''.join(values))
+
+        file.seek(columns_offset)
+        file.write(b''.join(_U64.pack(offset) for offset in column_offsets))
+
+    os.replace(f'{path}.tmp', path)
+
+
+class SnapshotReader(object):
+    """Memory-mapped snapshot, values are only decoded when accessed."""
+
+    def __init__(self, path: str) -> None:
+        self._file = open(path, 'rb')
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, kind, self.timestamp, unit_count, column_count = _HEADER.unpack_from(self._data, 0)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            self.close()
+            raise ValueError(f'Not a snapshot file: {path}')
+
+        self.is_delta = kind == DELTA_SNAPSHOT
+        offset = _HEADER.size
+        names = []
+        for _ in range(unit_count + column_count):
+            name, offset = _read_string(self._data, offset)
+            names.append(name)
+
+        self.unit_names = names[:unit_count]
+        self.properties = names[unit_count:]
+        self._units = {unit_name: index for index, unit_name in enumerate(self.unit_names)}
+        self._columns = {
+            property_name: _U64.unpack_from(self._data, offset + index * _U64.size)[0]
+            for index, property_name in enumerate(self.properties)
+        }
+
+    def __enter__(self) -> 'SnapshotReader':
+        return self
+
+    def __exit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._data.close()
+        self._file.close()
+
+    def has_value(self, unit_name: str, property_name: str) -> bool:
+        raw = self.get_raw(unit_name, property_name)
+        return raw is not None and raw[0] != MISSING_TAG
+
+    def get(self, unit_name: str, property_name: str, default: Any = None) -> Any:
+        raw = self.get_raw(unit_name, property_name)
+        if raw is None or raw[0] == MISSING_TAG:
+            return default
+        return decode_value(raw, 0)[0]
+
+    def get_unit(self, unit_name: str) -> dict[str, Any]:
+        return {property_name: self.get(unit_name, property_name) for property_name in self.properties
+                if self.has_value(unit_name, property_name)}
+
+    def to_dict(self) -> dict[str, dict[str, Any]]:
+        return {unit_name: self.get_unit(unit_name) for unit_name in self.unit_names}
+
+    def get_raw(self, unit_name: str, property_name: str) -> Optional[bytes]:
+        """Encoded value, equal values have equal encodings in any snapshot."""
+        unit_index = self._units.get(unit_name)
+        column_offset = self._columns.get(property_name)
+        if unit_index is None or column_offset is None:
+            return None
+
+        start, end = struct.unpack_from('<2I', self._data, column_offset + unit_index * _U32.size)
+        values_offset = column_offset + (len(self.unit_names) + 1) * _U32.size
+        return self._data[values_offset + start:values_offset + end]
+
+
+def diff_snapshots(old: SnapshotReader, new: SnapshotReader) -> SnapshotDiff:
+    """Compare encoded values, only the values that differ are decoded."""
+    old_units = set(old.unit_names)
+    new_units = set(new.unit_names)
+    diff = SnapshotDiff([name for name in new.unit_names if name not in old_units],
+                        [name for name in old.unit_names if name not in new_units])
+    properties = [property_name for property_name in new.properties if property_name in set(old.properties)]
+
+    for unit_name in new.unit_names:
+        if unit_name not in old_units:
+            continue
+        for property_name in properties:
+            if old.get_raw(unit_name, property_name) != new.get_raw(unit_name, property_name):
+                diff.changed.setdefault(unit_name, {})[property_name] = (
+                    old.get(unit_name, property_name), new.get(unit_name, property_name))
+
+    return diff
+
+
+def apply_delta(units: dict[str, dict[str, Any]], delta: SnapshotReader) -> dict[str, dict[str, Any]]:
+    result = {unit_name: dict(properties) for unit_name, properties in units.items()}
+
+    for unit_name in delta.unit_names:
+        result.setdefault(unit_name, {}).update(delta.get_unit(unit_name))
+
+    return result
+
+
+class SnapshotRecorder(object):
+    """Writes full snapshots, and in between deltas of the property changes received as signals."""
+
+    FULL_SNAPSHOT_PREFIX = 'snapshot'
+    DELTA_SNAPSHOT_PREFIX = 'delta'
+    SNAPSHOT_EXTENSION = '.snap'
+
+    def __init__(self, systemd: Systemd, directory: str, properties: list[str], interface: Optional[str] = None,
+                 max_events: int = 65536) -> None:
+        self._systemd = systemd
+        self._directory = directory
+        self._properties = properties
+        self._interface = interface or 'org.freedesktop.systemd1.Unit'
+        self._max_events = max_events
+        self._stream: Optional[UnitEventStream] = None
+        self._subscribed = False
+        self._changes: dict[str, dict[str, Any]] = {}
+        self._invalidated: dict[str, set[str]] = {}
+        self._dropped = 0
+
+    def __enter__(self) -> 'SnapshotRecorder':
+        if not self.start():
+            raise RuntimeError('Failed to start recording unit events')
+        return self
+
+    def __exit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        self.close()
+
+    def start(self) -> bool:
+        self._stream = self._systemd.stream_unit_events(max_size=self._max_events)
+        self._dropped = 0
+        if self._stream is None:
+            log.error('Failed to stream unit events, deltas can not be taken')
+            return False
+
+        # The manager only sends unit property changes while at least one client is subscribed
+        if not self._systemd.subscribe_to_property_changes():
+            self.close()
+            return False
+        self._subscribed = True
+
+        return True
+
+    def close(self) -> None:
+        if self._stream:
+            self._stream.close()
+            self._stream = None
+
+        if self._subscribed:
+            self._systemd.unsubscribe_from_property_changes()
+            self._subscribed = False
+
+    def take_snapshot(self) -> Optional[str]:
+        self._collect_changes()
+        units = self._systemd.get_units_properties(self._properties, interface=self._interface)
+        if units is None:
+            log.error('Failed to take snapshot')
+            return None
+
+        self._changes.clear()
+        self._invalidated.clear()
+        if self._stream is not None:
+            self._dropped = self._stream.dropped
+        return self._write(self.FULL_SNAPSHOT_PREFIX, units, False)
+
+    def take_delta(self) -> Optional[str]:
+        if self._stream is None:
+            log.error('Event stream is not started, can not take delta')
+            return None
+
+        self._collect_changes()
+        if self._stream.dropped != self._dropped:
+            log.warning('Events were dropped, taking full snapshot instead of delta', dropped=self._stream.dropped)
+            return self.take_snapshot()
+
+        if self._invalidated and not self._read_invalidated():
+            log.warning('Failed to read invalidated properties, taking full snapshot instead of delta')
+            return self.take_snapshot()
+
+        changes, self._changes = self._changes, {}
+        return self._write(self.DELTA_SNAPSHOT_PREFIX, changes, True)
+
+    def _collect_changes(self) -> None:
+        if self._stream is None:
+            return
+
+        while (event := self._stream.get(0)) is not None:
+            if event.interface != self._interface:
+                continue
+            changed = {name: value for name, value in event.changed.items() if name in self._properties}
+            if changed:
+                self._changes.setdefault(event.unit_name, {}).update(changed)
+                self._invalidated.get(event.unit_name, set()).difference_update(changed)
+
+            # Invalidated properties are sent without their values, these are read when the delta is taken
+            for name in event.invalidated:
+                if name in self._properties:
+                    self._invalidated.setdefault(event.unit_name, set()).add(name)
+                    self._changes.get(event.unit_name, {}).pop(name, None)
+
+    def _read_invalidated(self) -> bool:
+        unit_names = [unit_name for unit_name, names in self._invalidated.items() if names]
+        units = self._systemd.get_units_properties(self._properties, unit_names, self._interface) if unit_names else {}
+        if units is None:
+            return False
+
+        for unit_name, properties in units.items():
+            names = self._invalidated.get(unit_name, set())
+            values = {name: value for name, value in properties.items() if name in names}
+            if values:
+                self._changes.setdefault(unit_name, {}).update(values)
+
+        self._invalidated.clear()
+        return True
+
+    def _write(self, prefix: str, units: dict[str, dict[str, Any]], delta: bool) -> str:
+        timestamp = time.time()
+        path = os.path.join(self._directory, f'{prefix}-{int(timestamp * 1000)}{self.SNAPSHOT_EXTENSION}')
+        write_snapshot(path, units, self._properties, timestamp, delta)
+        log.info('Snapshot written', path=path, units=len(units), delta=delta)
+        return path
+
+
+def _write_string(file: BinaryIO, value: str) -> None:
+    encoded = value.encode()
+    file.write(_U32.pack(len(encoded)) + encoded)
+
+
+def _read_string(data: Any, offset: int) -> tuple[str, int]:
+    length = _U32.unpack_from(data, offset)[0]
+    offset += _U32.size
+    return bytes(data[offset:offset + length]).decode(), offset + length
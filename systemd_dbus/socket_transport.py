@@ -0,0 +1,285 @@
+# SPDX-FileCopyrightText: 2024 Ferenc Nandor Janky <ferenj@effective-range.com>
+# SPDX-FileCopyrightText: 2024 Attila Gombos <attila.gombos@effective-range.com>
+# SPDX-License-Identifier: MIT
+
+import os
+import socket
+from itertools import count
+from queue import Queue
+from threading import Lock, Thread, Event
+from typing import Any, Optional
+
+from context_logger import get_logger
+
+from .message import Message, METHOD_CALL, METHOD_RETURN, ERROR, SIGNAL, HEADER_PREFIX_SIZE, guess_signature
+from .transport import Transport, TransportError, SignalReceiver
+
+log = get_logger('SocketTransport')
+
+
+class _PendingCall(object):
+
+    def __init__(self) -> None:
+        self.event = Event()
+        self.reply: Optional[Message] = None
+
+
+class SocketTransport(Transport):
+    """Pure-Python D-Bus client over a unix socket, signals are dispatched on a dedicated thread."""
+
+    SYSTEM_BUS_ADDRESS = 'unix:path=/run/dbus/system_bus_socket'
+    DBUS_BUS_NAME = 'org.freedesktop.DBus'
+    DBUS_OBJECT_PATH = '/org/freedesktop/DBus'
+    NO_REPLY_ERROR = 'org.freedesktop.DBus.Error.NoReply'
+    DISCONNECTED_ERROR = 'org.freedesktop.DBus.Error.Disconnected'
+    DEFAULT_TIMEOUT = 25.0
+    MAX_QUEUED_SIGNALS = 1024
+
+    def __init__(self, address: Optional[str] = None, timeout: float = DEFAULT_TIMEOUT,
+                 max_queued_signals: int = MAX_QUEUED_SIGNALS) -> None:
+        self._address = address or os.environ.get('DBUS_SYSTEM_BUS_ADDRESS', self.SYSTEM_BUS_ADDRESS)
+        self._timeout = timeout
+        self._socket: Optional[socket.socket] = None
+        self._serials = count(1)
+        self._pending: dict[int, _PendingCall] = {}
+        # Match rules of the receivers, with the connection they were added on
+        self._receivers: dict[SignalReceiver, tuple[str, socket.socket]] = {}
+        # Bounded, so that handlers blocking the dispatch also stop the reading of the socket instead of queueing
+        self._signals: Queue[Optional[Message]] = Queue(max_queued_signals)
+        self._connect_lock = Lock()
+        self._send_lock = Lock()
+        self._lock = Lock()
+        self._unique_name: Optional[str] = None
+
+    @property
+    def unique_name(self) -> Optional[str]:
+        return self._unique_name
+
+    def call_method(self, bus_name: str, object_path: str, interface: str, method: str, *args: Any,
+                    timeout: Optional[float] = None) -> Any:
+        self._connect()
+        return self._call(bus_name, object_path, interface, method, list(args),
+                          self._timeout if timeout is None else timeout)
+
+    def add_signal_receiver(self, handler: Any, signal_name: str, interface: str, bus_name: Optional[str] = None,
+                            path: Optional[str] = None, path_keyword: Optional[str] = None) -> Any:
+        self._connect()
+
+        rule = f"type='signal',interface='{interface}',member='{signal_name}'"
+        if bus_name:
+            rule += f",sender='{bus_name}'"
+        if path:
+            rule += f",path='{path}'"
+
+        sender = None
+        if bus_name and not bus_name.startswith(':'):
+            sender = self.call_method(self.DBUS_BUS_NAME, self.DBUS_OBJECT_PATH, self.DBUS_BUS_NAME,
+                                      'GetNameOwner', bus_name)
+
+        # Registered before the match is added, so signals sent right after the reply are dispatched as well
+        receiver = SignalReceiver(handler, signal_name, interface, path, path_keyword, sender, self._remove_receiver)
+        with self._lock:
+            connection = self._socket
+            if connection is None:
+                raise TransportError('Connection closed while adding signal receiver', self.DISCONNECTED_ERROR)
+            self._receivers[receiver] = (rule, connection)
+
+        try:
+            self.call_method(self.DBUS_BUS_NAME, self.DBUS_OBJECT_PATH, self.DBUS_BUS_NAME, 'AddMatch', rule)
+        except TransportError:
+            with self._lock:
+                self._receivers.pop(receiver, None)
+            raise
+
+        return receiver
+
+    def close(self) -> None:
+        with self._connect_lock:
+            if self._socket is None:
+                return
+            self._close_connection(self._socket)
+            self._socket = None
+
+    def _connect(self) -> None:
+        with self._connect_lock:
+            if self._socket is not None:
+                return
+
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                connection.connect(self._get_socket_address())
+                self._authenticate(connection)
+            except OSError as error:
+                connection.close()
+                raise TransportError(f'Failed to connect to {self._address}: {error}', self.DISCONNECTED_ERROR)
+
+            Thread(target=self._read_messages, args=[connection], daemon=True).start()
+            Thread(target=self._dispatch_signals, daemon=True).start()
+
+            # The bus rejects messages of clients not registered yet, so the connection is only used after Hello
+            try:
+                unique_name = self._call(self.DBUS_BUS_NAME, self.DBUS_OBJECT_PATH, self.DBUS_BUS_NAME, 'Hello', [],
+                                         self._timeout, connection)
+            except TransportError:
+                self._close_connection(connection)
+                raise
+
+            self._socket = connection
+            self._unique_name = unique_name
+
+        log.debug('Connected to bus', address=self._address, unique_name=unique_name)
+
+    def _close_connection(self, connection: socket.socket) -> None:
+        # Shutting down wakes the reader thread blocked on the socket
+        try:
+            connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        connection.close()
+
+    def _get_socket_address(self) -> str:
+        for address in self._address.split(';'):
+            transport, _, options = address.partition(':')
+            if transport != 'unix':
+                continue
+            parameters = dict(option.split('=', 1) for option in options.split(',') if '=' in option)
+            if 'path' in parameters:
+                return parameters['path']
+            if 'abstract' in parameters:
+                return f'\0{parameters["abstract"]}'
+
+        raise OSError(f'Unsupported bus address: {self._address}')
+
+    def _authenticate(self, connection: socket.socket) -> None:
+        uid = str(os.getuid()).encode().hex()
+        connection.sendall(f'\0AUTH EXTERNAL {uid}\r\n'.encode())
+
+        response = b''
+        while not response.endswith(b'\r\n'):
+            chunk = connection.recv(256)
+            if not chunk:
+                break
+            response += chunk
+
+        if not response.startswith(b'OK'):
+            raise OSError(f'Authentication rejected: {response.decode(errors="replace").strip()}')
+
+        connection.sendall(b'BEGIN\r\n')
+
+    def _call(self, bus_name: str, object_path: str, interface: str, method: str, args: list[Any],
+              timeout: float, connection: Optional[socket.socket] = None) -> Any:
+        serial = next(self._serials)
+        signature = ''.join(guess_signature(arg) for arg in args)
+        message = Message(METHOD_CALL, serial, object_path, interface, method, destination=bus_name,
+                          signature=signature, body=args)
+
+        pending = _PendingCall()
+        with self._lock:
+            self._pending[serial] = pending
+
+        try:
+            self._send(message, connection)
+            if not pending.event.wait(timeout):
+                raise TransportError(f'Did not receive a reply to {method} in {timeout} seconds', self.NO_REPLY_ERROR)
+        finally:
+            with self._lock:
+                self._pending.pop(serial, None)
+
+        reply = pending.reply
+        if reply is None:
+            raise TransportError(f'Connection closed while calling {method}', self.DISCONNECTED_ERROR)
+        if reply.message_type == ERROR:
+            raise TransportError(str(reply.body[0]) if reply.body else '', reply.error_name)
+
+        if not reply.body:
+            return None
+        return reply.body[0] if len(reply.body) == 1 else tuple(reply.body)
+
+    def _send(self, message: Message, connection: Optional[socket.socket] = None) -> None:
+        data = message.marshal()
+
+        with self._send_lock:
+            connection = connection or self._socket
+            if connection is None:
+                raise TransportError('Not connected', self.DISCONNECTED_ERROR)
+            try:
+                connection.sendall(data)
+            except OSError as error:
+                raise TransportError(str(error), self.DISCONNECTED_ERROR)
+
+    def _read_messages(self, connection: socket.socket) -> None:
+        reader = connection.makefile('rb')
+
+        try:
+            while True:
+                prefix = reader.read(HEADER_PREFIX_SIZE)
+                if len(prefix) < HEADER_PREFIX_SIZE:
+                    break
+                data = prefix + reader.read(Message.get_size(prefix) - HEADER_PREFIX_SIZE)
+                self._handle_message(Message.unmarshal(data))
+        except (OSError, ValueError) as error:
+            log.warning('Stopped reading messages', address=self._address, reason=error)
+        finally:
+            # Pending calls are released first, as Hello is waited for while connecting
+            with self._lock:
+                pending_calls = list(self._pending.values())
+            for pending in pending_calls:
+                pending.event.set()
+            self._disconnect(connection)
+            self._signals.put(None)
+
+    def _handle_message(self, message: Message) -> None:
+        if message.message_type in [METHOD_RETURN, ERROR] and message.reply_serial is not None:
+            with self._lock:
+                pending = self._pending.get(message.reply_serial)
+            if pending:
+                pending.reply = message
+                pending.event.set()
+        elif message.message_type == SIGNAL:
+            self._signals.put(message)
+
+    def _dispatch_signals(self) -> None:
+        # Handlers run outside the reader thread, so they are free to call methods
+        while (message := self._signals.get()) is not None:
+            with self._lock:
+                receivers = [receiver for receiver in self._receivers
+                             if receiver.matches(str(message.member), str(message.interface), str(message.path),
+                                                 message.sender)]
+            for receiver in receivers:
+                try:
+                    receiver.dispatch(str(message.path), message.body)
+                except Exception as error:
+                    log.error('Signal handler failed', signal=message.member, path=message.path, reason=error)
+
+    def _disconnect(self, connection: socket.socket) -> None:
+        # The next call connects again, instead of waiting for replies that can not arrive on a closed connection
+        with self._connect_lock:
+            lost = self._socket is connection
+            if lost:
+                self._socket = None
+                self._unique_name = None
+
+        try:
+            connection.close()
+        except OSError:
+            pass
+
+        with self._lock:
+            receivers = [receiver for receiver, (_, receiver_connection) in self._receivers.items()
+                         if receiver_connection is connection]
+            for receiver in receivers:
+                del self._receivers[receiver]
+
+        if lost:
+            log.warning('Disconnected from bus, signal receivers are dropped', address=self._address,
+                        receivers=len(receivers))
+
+    def _remove_receiver(self, receiver: SignalReceiver) -> None:
+        with self._lock:
+            rule, connection = self._receivers.pop(receiver, (None, None))
+
+        if rule is not None and connection is self._socket:
+            try:
+                self.call_method(self.DBUS_BUS_NAME, self.DBUS_OBJECT_PATH, self.DBUS_BUS_NAME, 'RemoveMatch', rule)
+            except TransportError as error:
+                log.warning('Failed to remove match rule', rule=rule, reason=error)
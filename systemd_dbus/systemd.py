@@ -2,11 +2,20 @@
 # SPDX-FileCopyrightText: 2024 Attila Gombos <attila.gombos@effective-range.com>
 # SPDX-License-Identifier: MIT
 
-from typing import Optional, Any
+import os
+import time
+from contextvars import copy_context
+from string import ascii_letters, digits
+from threading import Lock
+from typing import Optional, Any, Callable, ContextManager
 
-import dbus
 from context_logger import get_logger
-from dbus import SystemBus, DBusException, Interface
+
+from .barrier import StateBarrier, BarrierResult
+from .deadline import Deadline, DeadlineTransport
+from .events import UnitEvent, UnitEventStream
+from .reconciler import UnitState, UnitStatus, UnitReport, ReconcilePlan, plan_reconciliation
+from .transport import Transport, TransportError, create_transport
 
 log = get_logger('SystemdDbus')
 
@@ -34,6 +43,22 @@ class Systemd(object):
     def reload_service(self, service_name: str, mode: Optional[str] = None) -> bool:
         raise NotImplementedError()
 
+    def start_services(self, patterns: list[str], states: Optional[list[str]] = None,
+                       mode: Optional[str] = None) -> Optional[dict[str, bool]]:
+        raise NotImplementedError()
+
+    def stop_services(self, patterns: list[str], states: Optional[list[str]] = None,
+                      mode: Optional[str] = None) -> Optional[dict[str, bool]]:
+        raise NotImplementedError()
+
+    def restart_services(self, patterns: list[str], states: Optional[list[str]] = None,
+                         mode: Optional[str] = None) -> Optional[dict[str, bool]]:
+        raise NotImplementedError()
+
+    def reload_services(self, patterns: list[str], states: Optional[list[str]] = None,
+                        mode: Optional[str] = None) -> Optional[dict[str, bool]]:
+        raise NotImplementedError()
+
     def enable_service(self, service_name: str) -> bool:
         raise NotImplementedError()
 
@@ -82,17 +107,69 @@ class Systemd(object):
     def reload_daemon(self) -> bool:
         raise NotImplementedError()
 
+    def get_unit_states(self, unit_names: list[str]) -> Optional[dict[str, UnitStatus]]:
+        raise NotImplementedError()
+
+    def reconcile(self, desired_state: dict[str, UnitState], dry_run: bool = False,
+                  timeout: Optional[float] = None) -> dict[str, UnitReport]:
+        raise NotImplementedError()
+
+    def wait_for_states(self, target_states: dict[str, str], timeout: float) -> BarrierResult:
+        raise NotImplementedError()
+
+    def stream_unit_events(self, unit_names: Optional[list[str]] = None, max_size: int = 1024,
+                           policy: str = UnitEventStream.DROP_OLDEST,
+                           stream: Optional[UnitEventStream] = None) -> Optional[UnitEventStream]:
+        raise NotImplementedError()
+
+    def add_manager_signal_handler(self, signal_name: str, handler: Any) -> Optional[Any]:
+        raise NotImplementedError()
+
+    def get_units_properties(self, property_names: list[str], unit_names: Optional[list[str]] = None,
+                             interface: Optional[str] = None) -> Optional[dict[str, dict[str, Any]]]:
+        raise NotImplementedError()
+
+    def deadline(self, timeout: float) -> ContextManager[Deadline]:
+        raise NotImplementedError()
+
+    def get_call_statistics(self) -> dict[str, dict[str, int]]:
+        raise NotImplementedError()
+
+    def is_last_result_stale(self) -> bool:
+        raise NotImplementedError()
+
 
 class SystemdDbus(Systemd):
     SYSTEMD_BUS_NAME = 'org.freedesktop.systemd1'
     SYSTEMD_OBJECT_PATH = '/org/freedesktop/systemd1'
+    SYSTEMD_UNIT_PATH_PREFIX = f'{SYSTEMD_OBJECT_PATH}/unit/'
+    UNIT_TYPES = ['service', 'socket', 'device', 'mount', 'automount', 'swap', 'target', 'path', 'timer', 'slice',
+                  'scope']
     SYSTEMD_MANAGER_INTERFACE = f'{SYSTEMD_BUS_NAME}.Manager'
     SYSTEMD_UNIT_INTERFACE = f'{SYSTEMD_BUS_NAME}.Unit'
     SYSTEMD_SERVICE_INTERFACE = f'{SYSTEMD_BUS_NAME}.Service'
     DBUS_PROPERTIES_INTERFACE = 'org.freedesktop.DBus.Properties'
-
-    def __init__(self, system_bus: SystemBus) -> None:
+    UNIT_FILE_OPERATION_ARGS = {
+        'enable': [False, True],
+        'disable': [False],
+        'mask': [False, True],
+        'unmask': [False]
+    }
+    DEFAULT_JOB_TIMEOUT = 90.0
+    JOB_POLL_INTERVAL = 0.1
+
+    def __init__(self, system_bus: Any = None, max_workers: int = 8, transport: Optional[Transport] = None,
+                 timeouts: Optional[dict[str, float]] = None, default_timeout: Optional[float] = None,
+                 stale_fallback: bool = False, manager_name: Optional[str] = None) -> None:
         self._system_bus = system_bus
+        self._max_workers = max_workers
+        self._backend = transport
+        self._timeouts = timeouts
+        self._default_timeout = default_timeout
+        self._stale_fallback = stale_fallback
+        self._manager_name = manager_name
+        self._transport: Optional[DeadlineTransport] = None
+        self._transport_lock = Lock()
 
     def __enter__(self) -> 'SystemdDbus':
         self.subscribe_to_property_changes()
@@ -103,27 +180,27 @@ class SystemdDbus(Systemd):
 
     def subscribe_to_property_changes(self) -> bool:
         try:
-            self._get_interface().Subscribe()
+            self._call_manager('Subscribe')
             return True
-        except DBusException as error:
+        except TransportError as error:
             log.error('Failed to subscribe to state changes', reason=error)
             return False
 
     def unsubscribe_from_property_changes(self) -> bool:
         try:
-            self._get_interface().Unsubscribe()
+            self._call_manager('Unsubscribe')
             return True
-        except DBusException as error:
+        except TransportError as error:
             log.error('Failed to unsubscribe from state changes', reason=error)
             return False
 
     def add_property_change_handler(self, service_path: str, handler: Any) -> bool:
         try:
-            self._system_bus.add_signal_receiver(handler, 'PropertiesChanged',
-                                                 self.DBUS_PROPERTIES_INTERFACE, path=service_path)
+            self._get_transport().add_signal_receiver(handler, 'PropertiesChanged',
+                                                      self.DBUS_PROPERTIES_INTERFACE, path=service_path)
             log.debug('Added property change handler', service_path=service_path)
             return True
-        except DBusException as error:
+        except TransportError as error:
             log.error('Failed to add property change handler', service_path=service_path, reason=error)
             return False
 
@@ -139,17 +216,33 @@ class SystemdDbus(Systemd):
     def reload_service(self, service_name: str, mode: Optional[str] = None) -> bool:
         return self._service_operation('reload-or-restart', service_name, mode)
 
+    def start_services(self, patterns: list[str], states: Optional[list[str]] = None,
+                       mode: Optional[str] = None) -> Optional[dict[str, bool]]:
+        return self._services_operation('start', patterns, states, mode)
+
+    def stop_services(self, patterns: list[str], states: Optional[list[str]] = None,
+                      mode: Optional[str] = None) -> Optional[dict[str, bool]]:
+        return self._services_operation('stop', patterns, states, mode)
+
+    def restart_services(self, patterns: list[str], states: Optional[list[str]] = None,
+                         mode: Optional[str] = None) -> Optional[dict[str, bool]]:
+        return self._services_operation('restart', patterns, states, mode)
+
+    def reload_services(self, patterns: list[str], states: Optional[list[str]] = None,
+                        mode: Optional[str] = None) -> Optional[dict[str, bool]]:
+        return self._services_operation('reload-or-restart', patterns, states, mode)
+
     def enable_service(self, service_name: str) -> bool:
-        return self._service_file_operation('enable', [dbus.Boolean(False), dbus.Boolean(True)], service_name)
+        return self._service_file_operation('enable', [self._postfix_service_name(service_name)])
 
     def disable_service(self, service_name: str) -> bool:
-        return self._service_file_operation('disable', [dbus.Boolean(False)], service_name)
+        return self._service_file_operation('disable', [self._postfix_service_name(service_name)])
 
     def mask_service(self, service_name: str) -> bool:
-        return self._service_file_operation('mask', [dbus.Boolean(False), dbus.Boolean(True)], service_name)
+        return self._service_file_operation('mask', [self._postfix_service_name(service_name)])
 
     def unmask_service(self, service_name: str) -> bool:
-        return self._service_file_operation('unmask', [dbus.Boolean(False)], service_name)
+        return self._service_file_operation('unmask', [self._postfix_service_name(service_name)])
 
     def is_active(self, service_name: str) -> bool:
         service_state = self.get_active_state(service_name)
@@ -194,10 +287,9 @@ class SystemdDbus(Systemd):
     def get_service_file_state(self, service_name: str) -> Optional[str]:
         try:
             service_name = self._postfix_service_name(service_name)
-            interface = self._get_interface()
-            state = interface.GetUnitFileState(service_name)
+            state = self._call_manager('GetUnitFileState', service_name)
             return str(state)
-        except DBusException as error:
+        except TransportError as error:
             log.error('Failed to get service file state', service=service_name, reason=error)
             return None
 
@@ -208,70 +300,363 @@ class SystemdDbus(Systemd):
         return self._get_service_properties(service_name, self.SYSTEMD_UNIT_INTERFACE)
 
     def list_service_names(self, states: Optional[list[str]] = None, patterns: Optional[list[str]] = None) -> list[str]:
-        try:
-            interface = self._get_interface()
-            units = interface.ListUnitsByPatterns(states or [], patterns or [])
-            return [str(unit[0]) for unit in units]
-        except DBusException as error:
-            log.error('Failed to list service names', reason=error)
-            return []
+        return self._list_unit_names(states, patterns) or []
 
     def reload_daemon(self) -> bool:
         method = 'Reload'
 
         try:
-            interface = self._get_interface()
-            getattr(interface, method)()
+            self._call_manager(method)
             return True
-        except DBusException as error:
+        except TransportError as error:
             log.error('Failed to reload systemd daemon', method=method, reason=error)
         return False
 
+    def get_unit_states(self, unit_names: list[str]) -> Optional[dict[str, UnitStatus]]:
+        unit_names = [self._postfix_service_name(unit_name) for unit_name in unit_names]
+        unit_states = self._list_units_by_names(unit_names)
+
+        if unit_states is None or not unit_names:
+            return unit_states
+
+        try:
+            unit_files = self._call_manager('ListUnitFilesByPatterns', [], unit_names)
+        except TransportError as error:
+            log.error('Failed to list unit files', units=unit_names, reason=error)
+            return None
+
+        for unit_file_path, file_state in unit_files:
+            unit_status = unit_states.get(os.path.basename(str(unit_file_path)))
+            if unit_status:
+                unit_status.file_state = str(file_state)
+
+        # Template instances have no unit file of their own, so they are not listed by ListUnitFilesByPatterns
+        unlisted = [unit_status for unit_status in unit_states.values()
+                    if unit_status.file_state is None and unit_status.load_state != 'not-found']
+        file_states = map_concurrently(lambda unit_status: self.get_service_file_state(unit_status.name), unlisted,
+                                       self._max_workers)
+
+        for unit_status, file_state in zip(unlisted, file_states):
+            unit_status.file_state = file_state
+
+        return unit_states
+
+    def reconcile(self, desired_state: dict[str, UnitState], dry_run: bool = False,
+                  timeout: Optional[float] = None) -> dict[str, UnitReport]:
+        desired_state = {self._postfix_service_name(name): state for name, state in desired_state.items()}
+        current_state = self.get_unit_states(list(desired_state))
+
+        if current_state is None:
+            reports = {name: UnitReport(name) for name in desired_state}
+            for report in reports.values():
+                report.fail('failed to read current state')
+            return reports
+
+        plan = plan_reconciliation(desired_state, current_state)
+
+        if dry_run or plan.is_empty():
+            log.info('Reconciliation plan', dry_run=dry_run, file_operations=plan.file_operations(),
+                     job_operations=plan.job_operations())
+            return plan.reports
+
+        self._apply_file_operations(plan)
+        self._apply_job_operations(plan, timeout or self.DEFAULT_JOB_TIMEOUT)
+
+        return plan.reports
+
+    def wait_for_states(self, target_states: dict[str, str], timeout: float) -> BarrierResult:
+        target_states = {self._postfix_service_name(name): state for name, state in target_states.items()}
+        barrier = StateBarrier(target_states)
+        signal_matches = []
+
+        try:
+            # Handlers are registered before the bulk read, so transitions during the read are not missed
+            for unit_name in target_states:
+                handler = self._create_active_state_handler(barrier, unit_name)
+                signal_matches.append(self._get_transport().add_signal_receiver(
+                    handler, 'PropertiesChanged', self.DBUS_PROPERTIES_INTERFACE, path=self._get_unit_path(unit_name)))
+
+            unit_states = self._list_units_by_names(list(target_states))
+            if unit_states is None:
+                return barrier.wait(0)
+
+            # A signal dispatched while the read was in flight is newer than the read, so it is kept
+            for unit_status in unit_states.values():
+                barrier.update(unit_status.name, unit_status.active_state, only_if_unset=True)
+
+            result = barrier.wait(timeout)
+            if not result.success:
+                log.warning('Units did not reach target state', pending=result.pending, failed=result.failed)
+            return result
+        except TransportError as error:
+            log.error('Failed to wait for unit states', units=list(target_states), reason=error)
+            return barrier.wait(0)
+        finally:
+            for signal_match in signal_matches:
+                signal_match.remove()
+
+    def stream_unit_events(self, unit_names: Optional[list[str]] = None, max_size: int = 1024,
+                           policy: str = UnitEventStream.DROP_OLDEST,
+                           stream: Optional[UnitEventStream] = None) -> Optional[UnitEventStream]:
+        # Events of several managers can be merged into one stream, which is then not owned by this call
+        owned = stream is None
+        stream = stream or UnitEventStream(max_size, policy)
+        handler = self._create_unit_event_handler(stream)
+
+        try:
+            if unit_names is None:
+                stream.add_signal_match(self._get_transport().add_signal_receiver(
+                    handler, 'PropertiesChanged', self.DBUS_PROPERTIES_INTERFACE, self.SYSTEMD_BUS_NAME,
+                    path_keyword='path'))
+            else:
+                for unit_name in unit_names:
+                    unit_path = self._get_unit_path(self._postfix_service_name(unit_name))
+                    stream.add_signal_match(self._get_transport().add_signal_receiver(
+                        handler, 'PropertiesChanged', self.DBUS_PROPERTIES_INTERFACE, path=unit_path,
+                        path_keyword='path'))
+            return stream
+        except TransportError as error:
+            log.error('Failed to stream unit events', units=unit_names, reason=error)
+            if owned:
+                stream.close()
+            return None
+
+    def add_manager_signal_handler(self, signal_name: str, handler: Any) -> Optional[Any]:
+        try:
+            signal_match = self._get_transport().add_signal_receiver(
+                handler, signal_name, self.SYSTEMD_MANAGER_INTERFACE, self.SYSTEMD_BUS_NAME, self.SYSTEMD_OBJECT_PATH)
+            log.debug('Added manager signal handler', signal=signal_name)
+            return signal_match
+        except TransportError as error:
+            log.error('Failed to add manager signal handler', signal=signal_name, reason=error)
+            return None
+
+    def get_units_properties(self, property_names: list[str], unit_names: Optional[list[str]] = None,
+                             interface: Optional[str] = None) -> Optional[dict[str, dict[str, Any]]]:
+        try:
+            if unit_names is None:
+                units = self._call_manager('ListUnits')
+            else:
+                units = self._call_manager('ListUnitsByNames', unit_names)
+        except TransportError as error:
+            log.error('Failed to list units', units=unit_names, reason=error)
+            return None
+
+        unit_paths = {str(unit[0]): str(unit[6]) for unit in units if str(unit[2]) != 'not-found'}
+        interface = interface or self.SYSTEMD_UNIT_INTERFACE
+
+        # There is no multi-object read in the D-Bus API, so the per-unit reads are issued concurrently
+        results = map_concurrently(lambda unit_path: self._get_unit_properties(unit_path, interface, property_names),
+                                   list(unit_paths.values()), self._max_workers)
+
+        return {unit_name: properties for unit_name, properties in zip(unit_paths, results) if properties is not None}
+
+    def deadline(self, timeout: float) -> ContextManager[Deadline]:
+        return self._get_transport().deadline(timeout)
+
+    def get_call_statistics(self) -> dict[str, dict[str, int]]:
+        return self._get_transport().get_statistics()
+
+    def is_last_result_stale(self) -> bool:
+        # Calls of bulk operations run in copies of the context, their stale results are marked on a deadline scope
+        return self._get_transport().last_call_stale
+
+    def _get_unit_properties(self, unit_path: str, interface: str,
+                             property_names: list[str]) -> Optional[dict[str, Any]]:
+        try:
+            properties = self._get_transport().call_method(
+                self.SYSTEMD_BUS_NAME, unit_path, self.DBUS_PROPERTIES_INTERFACE, 'GetAll', interface)
+            return {name: properties[name] for name in property_names if name in properties}
+        except TransportError as error:
+            log.error('Failed to get unit properties', unit_path=unit_path, interface=interface, reason=error)
+            return None
+
+    def _create_unit_event_handler(self, stream: UnitEventStream) -> Any:
+        def handler(interface: str, changed: Any, invalidated: Any, path: str) -> None:
+            if path.startswith(self.SYSTEMD_UNIT_PATH_PREFIX):
+                transport = self._get_transport()
+                stream.put(UnitEvent(self._get_unit_name(path), str(interface), transport.to_python(changed),
+                                     time.time(), self._manager_name, transport.to_python(invalidated)))
+
+        return handler
+
+    def _create_active_state_handler(self, barrier: StateBarrier, unit_name: str) -> Any:
+        def handler(interface: str, changed: Any, invalidated: Any) -> None:
+            if interface == self.SYSTEMD_UNIT_INTERFACE and 'ActiveState' in changed:
+                barrier.update(unit_name, str(changed['ActiveState']))
+
+        return handler
+
+    def _apply_file_operations(self, plan: ReconcilePlan) -> None:
+        changed_units = []
+
+        for operation, unit_names in plan.file_operations():
+            if self._service_file_operation(operation, unit_names):
+                changed_units.extend(unit_names)
+            else:
+                for unit_name in unit_names:
+                    plan.reports[unit_name].fail(f'failed to {operation} unit file')
+
+        if changed_units and not self.reload_daemon():
+            for unit_name in changed_units:
+                plan.reports[unit_name].fail('failed to reload daemon')
+
+    def _apply_job_operations(self, plan: ReconcilePlan, timeout: float) -> None:
+        jobs = [(operation, unit_name) for operation, unit_names in plan.job_operations()
+                for unit_name in unit_names if plan.reports[unit_name].success]
+
+        # Jobs are only queued here, the queueing calls are issued concurrently and systemd executes the jobs
+        results = map_concurrently(lambda job: self._service_operation(job[0], job[1], None), jobs, self._max_workers)
+
+        queued_units = []
+        for (operation, unit_name), queued in zip(jobs, results):
+            if queued:
+                queued_units.append(unit_name)
+            else:
+                plan.reports[unit_name].fail(f'failed to {operation} unit')
+
+        if not queued_units:
+            return
+
+        unit_states = self._wait_for_jobs(queued_units, timeout)
+
+        for unit_name in queued_units:
+            report = plan.reports[unit_name]
+            unit_status = unit_states.get(unit_name)
+            if unit_status is None:
+                report.fail('failed to read unit state')
+            elif unit_status.job_id:
+                report.fail('timed out waiting for job')
+            elif unit_status.is_running != (unit_name in plan.start) and not self._is_finished_oneshot(unit_status):
+                report.fail(f'unit is {unit_status.active_state}')
+
+    def _is_finished_oneshot(self, unit_status: UnitStatus) -> bool:
+        # A oneshot service without RemainAfterExit is inactive again after it ran successfully
+        if unit_status.active_state != 'inactive' or not unit_status.object_path:
+            return False
+
+        properties = self._get_unit_properties(unit_status.object_path, self.SYSTEMD_SERVICE_INTERFACE,
+                                               ['Type', 'Result', 'ExecMainStatus'])
+        return (properties is not None and properties.get('Type') == 'oneshot'
+                and properties.get('Result') == 'success' and properties.get('ExecMainStatus') == 0)
+
+    def _wait_for_jobs(self, unit_names: list[str], timeout: float) -> dict[str, UnitStatus]:
+        deadline = time.monotonic() + timeout
+
+        while True:
+            unit_states = self._list_units_by_names(unit_names) or {}
+            pending = [name for name, unit_status in unit_states.items() if unit_status.job_id]
+            if not pending or time.monotonic() >= deadline:
+                return unit_states
+            time.sleep(self.JOB_POLL_INTERVAL)
+
+    def _list_units_by_names(self, unit_names: list[str]) -> Optional[dict[str, UnitStatus]]:
+        if not unit_names:
+            return {}
+
+        try:
+            units = self._call_manager('ListUnitsByNames', unit_names)
+        except TransportError as error:
+            log.error('Failed to list units', units=unit_names, reason=error)
+            return None
+
+        return {str(unit[0]): UnitStatus(name=str(unit[0]), load_state=str(unit[2]), active_state=str(unit[3]),
+                                         sub_state=str(unit[4]), job_id=int(unit[7]), object_path=str(unit[6]))
+                for unit in units}
+
     def _service_operation(self, operation: str, service_name: str, mode: Optional[str]) -> bool:
         try:
             service_name = self._postfix_service_name(service_name)
-            interface = self._get_interface()
             method = f'{self._convert_operation(operation)}Unit'
             if mode is None:
                 mode = 'replace'
-            getattr(interface, method)(service_name, mode)
+            self._call_manager(method, service_name, mode)
             return True
-        except DBusException as error:
+        except TransportError as error:
             log.error(f'Failed to {operation} service',
                       operation=operation, service=service_name, mode=mode, reason=error)
             return False
 
-    def _service_file_operation(self, operation: str, args: list[Any], service_name: str) -> bool:
+    def _services_operation(self, operation: str, patterns: list[str], states: Optional[list[str]],
+                            mode: Optional[str]) -> Optional[dict[str, bool]]:
+        if not patterns:
+            return {}
+
+        service_names = self._list_unit_names(states, patterns)
+        if service_names is None:
+            return None
+
+        # Jobs are only queued by these calls, so they can be issued without waiting for each other
+        results = map_concurrently(lambda service_name: self._service_operation(operation, service_name, mode),
+                                   service_names, self._max_workers)
+
+        return dict(zip(service_names, results))
+
+    def _list_unit_names(self, states: Optional[list[str]], patterns: Optional[list[str]]) -> Optional[list[str]]:
+        try:
+            units = self._call_manager('ListUnitsByPatterns', states or [], patterns or [])
+            return [str(unit[0]) for unit in units]
+        except TransportError as error:
+            log.error('Failed to list service names', reason=error)
+            return None
+
+    def _service_file_operation(self, operation: str, service_names: list[str]) -> bool:
         try:
-            service_name = self._postfix_service_name(service_name)
-            interface = self._get_interface()
             method = f'{self._convert_operation(operation)}UnitFiles'
-            getattr(interface, method)([service_name], *args)
+            self._call_manager(method, service_names, *self.UNIT_FILE_OPERATION_ARGS[operation])
             return True
-        except DBusException as error:
+        except TransportError as error:
             log.error(f'Failed to {operation} service file',
-                      operation=operation, service=service_name, reason=error)
+                      operation=operation, services=service_names, reason=error)
             return False
 
     def _get_service_properties(self, service_name: str, service_interface: str) -> Any:
         try:
             service_name = self._postfix_service_name(service_name)
-            interface = self._get_interface()
-            unit_path = interface.LoadUnit(service_name)
-            proxy_object = self._system_bus.get_object(self.SYSTEMD_BUS_NAME, unit_path)
-            properties = Interface(proxy_object, self.DBUS_PROPERTIES_INTERFACE)
-            return properties.GetAll(service_interface)
-        except DBusException as error:
+            unit_path = self._call_manager('LoadUnit', service_name)
+            return self._get_transport().call_method(
+                self.SYSTEMD_BUS_NAME, unit_path, self.DBUS_PROPERTIES_INTERFACE, 'GetAll', service_interface)
+        except TransportError as error:
             log.error('Failed to get service properties',
                       service=service_name, interface=service_interface, reason=error)
             return None
 
-    def _get_interface(self) -> Interface:
-        proxy_object = self._system_bus.get_object(self.SYSTEMD_BUS_NAME, self.SYSTEMD_OBJECT_PATH)
-        return Interface(proxy_object, self.SYSTEMD_MANAGER_INTERFACE)
+    def _get_transport(self) -> DeadlineTransport:
+        with self._transport_lock:
+            if self._transport is None:
+                backend = self._backend or create_transport('dbus-python', bus=self._system_bus)
+                self._transport = DeadlineTransport(backend, self._timeouts, self._default_timeout,
+                                                    self._stale_fallback)
+            return self._transport
+
+    def _call_manager(self, method: str, *args: Any) -> Any:
+        return self._get_transport().call_method(
+            self.SYSTEMD_BUS_NAME, self.SYSTEMD_OBJECT_PATH, self.SYSTEMD_MANAGER_INTERFACE, method, *args)
+
+    def _get_unit_path(self, unit_name: str) -> str:
+        # Same escaping as systemd's bus_label_escape()
+        label = ''.join(chr(byte) if chr(byte) in ascii_letters or (chr(byte) in digits and index > 0)
+                        else f'_{byte:02x}' for index, byte in enumerate(unit_name.encode()))
+        return f'{self.SYSTEMD_UNIT_PATH_PREFIX}{label or "_"}'
+
+    def _get_unit_name(self, unit_path: str) -> str:
+        label = unit_path[len(self.SYSTEMD_UNIT_PATH_PREFIX):]
+        if label == '_':
+            return ''
+        unit_name = bytearray()
+        index = 0
+        while index < len(label):
+            if label[index] == '_' and index + 2 < len(label):
+                unit_name.append(int(label[index + 1:index + 3], 16))
+                index += 3
+            else:
+                unit_name.append(ord(label[index]))
+                index += 1
+        return unit_name.decode(errors='replace')
 
     def _postfix_service_name(self, service_name: str) -> str:
-        if not service_name.endswith('.service'):
+        _, separator, unit_type = service_name.rpartition('.')
+        if not separator or unit_type not in self.UNIT_TYPES:
             return f'{service_name}.service'
         return service_name
 
@@ -280,3 +665,18 @@ class SystemdDbus(Systemd):
             return ''.join(word.capitalize() for word in operation.split('-'))
         else:
             return operation.capitalize()
+
+
+def map_concurrently(function: Callable[[Any], Any], items: list[Any], max_workers: int) -> list[Any]:
+    """Call the function for each item on a thread pool, returns the results in the order of the items."""
+    if len(items) < 2:
+        return [function(item) for item in items]
+
+    # Each call runs in a copy of the caller's context, so that an active deadline applies to it as well
+    contexts = [copy_context() for _ in items]
+
+    # Imported on first use, as it is not needed to load the package
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers) as executor:
+        return list(executor.map(lambda context, item: context.run(function, item), contexts, items))
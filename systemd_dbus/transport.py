@@ -0,0 +1,102 @@
+# SPDX-FileCopyrightText: 2024 Ferenc Nandor Janky <ferenj@effective-range.com>
+# SPDX-FileCopyrightText: 2024 Attila Gombos <attila.gombos@effective-range.com>
+# SPDX-License-Identifier: MIT
+
+from importlib import import_module
+from typing import Any, Optional, Callable
+
+TRANSPORT_BACKENDS = {
+    'dbus-python': ('.dbus_python_transport', 'DbusPythonTransport'),
+    'socket': ('.socket_transport', 'SocketTransport'),
+    'memory': ('.memory_transport', 'InMemoryTransport')
+}
+
+
+class TransportError(Exception):
+
+    def __init__(self, message: str, name: Optional[str] = None) -> None:
+        super().__init__(f'{name}: {message}' if name else message)
+        self.name = name
+
+
+class Transport(object):
+
+    def call_method(self, bus_name: str, object_path: str, interface: str, method: str, *args: Any,
+                    timeout: Optional[float] = None) -> Any:
+        raise NotImplementedError()
+
+    def add_signal_receiver(self, handler: Any, signal_name: str, interface: str, bus_name: Optional[str] = None,
+                            path: Optional[str] = None, path_keyword: Optional[str] = None) -> Any:
+        raise NotImplementedError()
+
+    def to_python(self, value: Any) -> Any:
+        return value
+
+    def close(self) -> None:
+        raise NotImplementedError()
+
+
+class SignalReceiver(object):
+    """Signal handler registration of backends that match and dispatch signals themselves."""
+
+    def __init__(self, handler: Any, signal_name: str, interface: str, path: Optional[str] = None,
+                 path_keyword: Optional[str] = None, sender: Optional[str] = None,
+                 on_remove: Optional[Callable[['SignalReceiver'], None]] = None) -> None:
+        self.handler = handler
+        self.signal_name = signal_name
+        self.interface = interface
+        self.path = path
+        self.path_keyword = path_keyword
+        self.sender = sender
+        self._on_remove = on_remove
+
+    def matches(self, signal_name: str, interface: str, path: str, sender: Optional[str] = None) -> bool:
+        if signal_name != self.signal_name or interface != self.interface:
+            return False
+        if self.path is not None and path != self.path:
+            return False
+        return self.sender is None or sender is None or sender == self.sender
+
+    def dispatch(self, path: str, args: list[Any]) -> None:
+        if self.path_keyword:
+            self.handler(*args, **{self.path_keyword: path})
+        else:
+            self.handler(*args)
+
+    def remove(self) -> None:
+        if self._on_remove:
+            self._on_remove(self)
+            self._on_remove = None
+
+
+def create_transport(backend: str = 'dbus-python', **kwargs: Any) -> Transport:
+    """Create a transport, importing the backend module only when it is first needed."""
+    try:
+        module_name, class_name = TRANSPORT_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f'Unknown transport backend: {backend}, expected one of {list(TRANSPORT_BACKENDS)}')
+
+    transport_class = getattr(import_module(module_name, __package__), class_name)
+    transport: Transport = transport_class(**kwargs)
+    return transport
+
+
+def to_python(value: Any, convert: Optional[Callable[[Any], Any]] = None) -> Any:
+    convert = convert or to_python
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        return str(value)
+    if isinstance(value, bytes):
+        return bytes(value)
+    if isinstance(value, int):
+        return int(value)
+    if isinstance(value, float):
+        return float(value)
+    if isinstance(value, dict):
+        return {convert(key): convert(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return tuple(convert(item) for item in value)
+    if isinstance(value, list):
+        return [convert(item) for item in value]
+    return value
@@ -0,0 +1,148 @@
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from context_logger import setup_logging
+
+from systemd_dbus import DeadlineTransport, Transport, TransportError
+
+NO_REPLY = TransportError('Did not receive a reply', 'org.freedesktop.DBus.Error.NoReply')
+
+
+class DeadlineTransportTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        setup_logging('systemd-dbus', warn_on_overwrite=False)
+
+    def setUp(self):
+        print()
+
+    def test_passes_no_timeout_when_not_configured(self):
+        # Given
+        backend = MagicMock(spec=Transport)
+        transport = DeadlineTransport(backend)
+
+        # When
+        transport.call_method('org.freedesktop.systemd1', '/', 'org.freedesktop.systemd1.Manager', 'Reload')
+
+        # Then
+        backend.call_method.assert_called_once_with('org.freedesktop.systemd1', '/',
+                                                    'org.freedesktop.systemd1.Manager', 'Reload', timeout=None)
+
+    def test_applies_per_method_timeout(self):
+        # Given
+        backend = MagicMock(spec=Transport)
+        transport = DeadlineTransport(backend, timeouts={'GetAll': 0.5}, default_timeout=2)
+
+        # When
+        transport.call_method('org.freedesktop.systemd1', '/unit/test', 'org.freedesktop.DBus.Properties', 'GetAll',
+                              'org.freedesktop.systemd1.Unit')
+        transport.call_method('org.freedesktop.systemd1', '/', 'org.freedesktop.systemd1.Manager', 'Reload')
+
+        # Then
+        self.assertEqual(0.5, backend.call_method.call_args_list[0].kwargs['timeout'])
+        self.assertEqual(2, backend.call_method.call_args_list[1].kwargs['timeout'])
+
+    def test_limits_timeout_to_remaining_time_of_deadline(self):
+        # Given
+        backend = MagicMock(spec=Transport)
+        transport = DeadlineTransport(backend, default_timeout=25)
+
+        # When
+        with transport.deadline(1):
+            transport.call_method('org.freedesktop.systemd1', '/', 'org.freedesktop.systemd1.Manager', 'ListUnits')
+
+        # Then
+        self.assertLessEqual(backend.call_method.call_args.kwargs['timeout'], 1)
+
+    def test_does_not_call_when_deadline_expired(self):
+        # Given
+        backend = MagicMock(spec=Transport)
+        transport = DeadlineTransport(backend)
+
+        # When
+        with transport.deadline(0.01) as deadline:
+            time.sleep(0.02)
+            with self.assertRaises(TransportError):
+                transport.call_method('org.freedesktop.systemd1', '/', 'org.freedesktop.systemd1.Manager', 'ListUnits')
+
+        # Then
+        backend.call_method.assert_not_called()
+        self.assertEqual(1, deadline.missed)
+        self.assertEqual({'deadline_misses': {'ListUnits': 1}, 'stale_results': {}}, transport.get_statistics())
+
+    def test_returns_last_result_marked_stale_when_deadline_missed(self):
+        # Given
+        backend = MagicMock(spec=Transport)
+        backend.call_method.side_effect = [{'ActiveState': 'active'}, NO_REPLY]
+        transport = DeadlineTransport(backend, stale_fallback=True)
+        args = ['org.freedesktop.systemd1', '/unit/test', 'org.freedesktop.DBus.Properties', 'GetAll',
+                'org.freedesktop.systemd1.Unit']
+        transport.call_method(*args)
+
+        # When
+        with transport.deadline(1) as deadline:
+            result = transport.call_method(*args)
+
+        # Then
+        self.assertEqual({'ActiveState': 'active'}, result)
+        self.assertTrue(deadline.stale)
+        self.assertTrue(transport.last_call_stale)
+        self.assertEqual({'deadline_misses': {'GetAll': 1}, 'stale_results': {'GetAll': 1}},
+                         transport.get_statistics())
+
+    def test_raises_error_when_deadline_missed_by_mutating_call(self):
+        # Given
+        backend = MagicMock(spec=Transport)
+        backend.call_method.side_effect = [None, NO_REPLY]
+        transport = DeadlineTransport(backend, stale_fallback=True)
+        args = ['org.freedesktop.systemd1', '/', 'org.freedesktop.systemd1.Manager', 'StartUnit', 'test', 'replace']
+        transport.call_method(*args)
+
+        # When
+        with self.assertRaises(TransportError):
+            transport.call_method(*args)
+
+        # Then
+        self.assertEqual({'deadline_misses': {'StartUnit': 1}, 'stale_results': {}}, transport.get_statistics())
+
+    def test_counts_misses_of_concurrent_calls_sharing_deadline(self):
+        # Given
+        backend = MagicMock(spec=Transport)
+        backend.call_method.side_effect = NO_REPLY
+        transport = DeadlineTransport(backend)
+
+        def call():
+            with self.assertRaises(TransportError):
+                transport.call_method('org.freedesktop.systemd1', '/', 'org.freedesktop.systemd1.Manager', 'ListUnits')
+
+        # When
+        with transport.deadline(5) as deadline:
+            contexts = [copy_context() for _ in range(1000)]
+            with ThreadPoolExecutor(8) as executor:
+                list(executor.map(lambda context: context.run(call), contexts))
+
+        # Then
+        self.assertEqual(1000, deadline.missed)
+        self.assertFalse(deadline.stale)
+
+    def test_propagates_other_errors(self):
+        # Given
+        backend = MagicMock(spec=Transport)
+        backend.call_method.side_effect = TransportError('No such unit', 'org.freedesktop.systemd1.NoSuchUnit')
+        transport = DeadlineTransport(backend, stale_fallback=True)
+
+        # When
+        with self.assertRaises(TransportError):
+            transport.call_method('org.freedesktop.systemd1', '/', 'org.freedesktop.systemd1.Manager', 'GetUnit', 'x')
+
+        # Then
+        self.assertEqual({'deadline_misses': {}, 'stale_results': {}}, transport.get_statistics())
+
+
+if __name__ == "__main__":
+    unittest.main()
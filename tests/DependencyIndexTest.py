@@ -0,0 +1,131 @@
+import unittest
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from context_logger import setup_logging
+
+from systemd_dbus import DependencyIndex, Systemd
+
+UNITS_PROPERTIES = {
+    'network.target': {'Requires': [], 'Wants': []},
+    'db.service': {'Requires': ['network.target'], 'Wants': []},
+    'app.service': {'Requires': ['db.service'], 'Wants': ['network.target']},
+    'app-worker.service': {'BindsTo': ['app.service']},
+    'app-metrics.service': {'PartOf': ['app.service']},
+    'report.timer': {'Wants': ['db.service']}
+}
+
+
+class DependencyIndexTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        setup_logging('systemd-dbus', warn_on_overwrite=False)
+
+    def setUp(self):
+        print()
+
+    def test_builds_forward_and_reverse_edges(self):
+        # Given
+        systemd = MagicMock(spec=Systemd)
+        systemd.get_units_properties.return_value = UNITS_PROPERTIES
+        index = DependencyIndex(systemd)
+
+        # When
+        result = index.build()
+
+        # Then
+        self.assertTrue(result)
+        self.assertEqual({'db.service'}, index.get_dependencies('app.service', 'Requires'))
+        self.assertEqual({'app.service'}, index.get_dependencies('db.service', 'RequiredBy'))
+        self.assertEqual({'app.service'}, index.get_dependencies('network.target', 'WantedBy'))
+        self.assertEqual({'app-metrics.service'}, index.get_dependencies('app.service', 'ConsistsOf'))
+        systemd.get_units_properties.assert_called_once_with(['Requires', 'Requisite', 'Wants', 'BindsTo', 'PartOf'])
+
+    def test_returns_false_when_fails_to_build(self):
+        # Given
+        systemd = MagicMock(spec=Systemd)
+        systemd.get_units_properties.return_value = None
+        index = DependencyIndex(systemd)
+
+        # When
+        result = index.build()
+
+        # Then
+        self.assertFalse(result)
+
+    def test_returns_transitively_impacted_units(self):
+        # Given
+        systemd = MagicMock(spec=Systemd)
+        systemd.get_units_properties.return_value = UNITS_PROPERTIES
+        index = DependencyIndex(systemd)
+        index.build()
+
+        # When
+        result = index.get_impacted_units('network.target')
+
+        # Then
+        self.assertEqual({'db.service', 'app.service', 'app-worker.service', 'app-metrics.service'}, result)
+        self.assertEqual({'app.service', 'report.timer'},
+                         index.get_impacted_units('db.service', ['RequiredBy', 'WantedBy']))
+        self.assertEqual(set(), index.get_impacted_units('unknown.service'))
+
+    def test_updates_on_unit_signals(self):
+        # Given
+        systemd = MagicMock(spec=Systemd)
+        systemd.get_units_properties.return_value = UNITS_PROPERTIES
+        with DependencyIndex(systemd) as index:
+            handlers = {call.args[0]: call.args[1] for call in systemd.add_manager_signal_handler.call_args_list}
+            systemd.get_units_properties.return_value = {'cache.service': {'Requires': ['db.service']}}
+
+            # When
+            handlers['UnitNew']('cache.service', '/org/freedesktop/systemd1/unit/cache_2eservice')
+            handlers['UnitRemoved']('app-metrics.service', '/org/freedesktop/systemd1/unit/app_2dmetrics_2eservice')
+
+            # Then
+            self.assertEqual({'app.service', 'cache.service'}, index.get_dependencies('db.service', 'RequiredBy'))
+            self.assertEqual(set(), index.get_dependencies('app.service', 'ConsistsOf'))
+            self.assertNotIn('app-metrics.service', index.get_unit_names())
+            systemd.get_units_properties.assert_called_with(
+                ['Requires', 'Requisite', 'Wants', 'BindsTo', 'PartOf'], ['cache.service'])
+
+        self.assertEqual(3, systemd.add_manager_signal_handler.return_value.remove.call_count)
+        systemd.subscribe_to_property_changes.assert_called_once()
+        systemd.unsubscribe_from_property_changes.assert_called_once()
+
+    def test_raises_error_when_fails_to_watch_unit_signals(self):
+        # Given
+        systemd = MagicMock(spec=Systemd)
+        systemd.get_units_properties.return_value = UNITS_PROPERTIES
+        systemd.subscribe_to_property_changes.return_value = False
+
+        # When
+        with self.assertRaises(RuntimeError):
+            with DependencyIndex(systemd):
+                pass
+
+        # Then
+        self.assertEqual(3, systemd.add_manager_signal_handler.return_value.remove.call_count)
+        systemd.unsubscribe_from_property_changes.assert_not_called()
+
+    def test_rebuilds_when_reload_finished(self):
+        # Given
+        systemd = MagicMock(spec=Systemd)
+        systemd.get_units_properties.return_value = UNITS_PROPERTIES
+        index = DependencyIndex(systemd)
+        index.build()
+        index.watch()
+        handlers = {call.args[0]: call.args[1] for call in systemd.add_manager_signal_handler.call_args_list}
+        systemd.get_units_properties.return_value = {'db.service': {'Requires': []}}
+
+        # When
+        handlers['Reloading'](True)
+        handlers['Reloading'](False)
+
+        # Then
+        self.assertEqual(2, systemd.get_units_properties.call_count)
+        self.assertEqual(['db.service'], index.get_unit_names())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from systemd_dbus import InMemoryTransport, TransportError
+
+
+class InMemoryTransportTest(TestCase):
+
+    def setUp(self):
+        print()
+
+    def test_calls_registered_method(self):
+        # Given
+        transport = InMemoryTransport()
+        transport.add_method('org.freedesktop.systemd1.Manager', 'GetUnitFileState', lambda name: 'enabled')
+
+        # When
+        result = transport.call_method('org.freedesktop.systemd1', '/org/freedesktop/systemd1',
+                                       'org.freedesktop.systemd1.Manager', 'GetUnitFileState', 'test.service')
+
+        # Then
+        self.assertEqual('enabled', result)
+        self.assertEqual([('/org/freedesktop/systemd1', 'org.freedesktop.systemd1.Manager', 'GetUnitFileState',
+                           ('test.service',))], transport.calls)
+
+    def test_prefers_method_registered_for_object_path(self):
+        # Given
+        transport = InMemoryTransport()
+        transport.add_method('org.freedesktop.DBus.Properties', 'GetAll', lambda interface: {'Id': 'any'})
+        transport.add_method('org.freedesktop.DBus.Properties', 'GetAll', lambda interface: {'Id': 'test.service'},
+                             '/unit/test')
+
+        # When
+        result = transport.call_method('org.freedesktop.systemd1', '/unit/test', 'org.freedesktop.DBus.Properties',
+                                       'GetAll', 'org.freedesktop.systemd1.Unit')
+
+        # Then
+        self.assertEqual({'Id': 'test.service'}, result)
+
+    def test_raises_error_when_method_is_unknown(self):
+        # Given
+        transport = InMemoryTransport()
+
+        # When
+        with self.assertRaises(TransportError) as context:
+            transport.call_method('org.freedesktop.systemd1', '/', 'org.freedesktop.systemd1.Manager', 'Reload')
+
+        # Then
+        self.assertEqual('org.freedesktop.DBus.Error.UnknownMethod', context.exception.name)
+
+    def test_dispatches_signals_to_matching_receivers(self):
+        # Given
+        transport = InMemoryTransport()
+        handler = MagicMock()
+        other_handler = MagicMock()
+        transport.add_signal_receiver(handler, 'PropertiesChanged', 'org.freedesktop.DBus.Properties',
+                                      path_keyword='path')
+        transport.add_signal_receiver(other_handler, 'PropertiesChanged', 'org.freedesktop.DBus.Properties',
+                                      path='/unit/other')
+
+        # When
+        result = transport.emit_signal('/unit/test', 'org.freedesktop.DBus.Properties', 'PropertiesChanged',
+                                       'org.freedesktop.systemd1.Unit', {'ActiveState': 'active'}, [])
+
+        # Then
+        self.assertEqual(1, result)
+        handler.assert_called_once_with('org.freedesktop.systemd1.Unit', {'ActiveState': 'active'}, [],
+                                        path='/unit/test')
+        other_handler.assert_not_called()
+
+    def test_does_not_dispatch_to_removed_receiver(self):
+        # Given
+        transport = InMemoryTransport()
+        handler = MagicMock()
+        receiver = transport.add_signal_receiver(handler, 'UnitNew', 'org.freedesktop.systemd1.Manager')
+
+        # When
+        receiver.remove()
+        result = transport.emit_signal('/org/freedesktop/systemd1', 'org.freedesktop.systemd1.Manager', 'UnitNew',
+                                       'test.service', '/unit/test')
+
+        # Then
+        self.assertEqual(0, result)
+        handler.assert_not_called()
+
+    def test_dispatches_signal_to_other_receivers_when_handler_fails(self):
+        # Given
+        transport = InMemoryTransport()
+        failing = MagicMock(side_effect=RuntimeError('failed'))
+        handler = MagicMock()
+        transport.add_signal_receiver(failing, 'UnitNew', 'org.freedesktop.systemd1.Manager')
+        transport.add_signal_receiver(handler, 'UnitNew', 'org.freedesktop.systemd1.Manager')
+
+        # When
+        result = transport.emit_signal('/org/freedesktop/systemd1', 'org.freedesktop.systemd1.Manager', 'UnitNew',
+                                       'test.service', '/unit/test')
+
+        # Then
+        self.assertEqual(2, result)
+        handler.assert_called_once_with('test.service', '/unit/test')
+        self.assertEqual(1, transport.handler_errors)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+from unittest import TestCase
+
+from systemd_dbus.message import Message, Variant, METHOD_CALL, METHOD_RETURN, split_signature, guess_signature
+
+
+class MessageTest(TestCase):
+
+    def setUp(self):
+        print()
+
+    def test_marshals_and_unmarshals_method_call(self):
+        # Given
+        message = Message(METHOD_CALL, 5, '/org/freedesktop/systemd1', 'org.freedesktop.systemd1.Manager',
+                          'EnableUnitFiles', destination='org.freedesktop.systemd1', signature='asbb',
+                          body=[['test1.service', 'test2.service'], False, True])
+
+        # When
+        data = message.marshal()
+        result = Message.unmarshal(data)
+
+        # Then
+        self.assertEqual(len(data), Message.get_size(data[:16]))
+        self.assertEqual(message, result)
+
+    def test_marshals_and_unmarshals_container_types(self):
+        # Given
+        message = Message(METHOD_RETURN, 6, reply_serial=5, signature='a{sv}a(ssuo)ayx',
+                          body=[{'ActiveState': 'active', 'Wants': Variant('as', ['test.target']), 'Enabled': True},
+                                [('test.service', 'Test', 42, '/org/freedesktop/systemd1/unit/test_2eservice')],
+                                b'\x01\x02', -1])
+
+        # When
+        result = Message.unmarshal(message.marshal())
+
+        # Then
+        self.assertEqual([{'ActiveState': 'active', 'Wants': ['test.target'], 'Enabled': True},
+                          [('test.service', 'Test', 42, '/org/freedesktop/systemd1/unit/test_2eservice')],
+                          b'\x01\x02', -1], result.body)
+        self.assertEqual(5, result.reply_serial)
+
+    def test_splits_signature_into_complete_types(self):
+        self.assertEqual(['as', 'a{sv}', '(sa(ii))', 'b'], split_signature('asa{sv}(sa(ii))b'))
+
+    def test_raises_error_when_signature_is_invalid(self):
+        with self.assertRaises(ValueError):
+            split_signature('z')
+
+    def test_guesses_signature(self):
+        self.assertEqual('asbb', ''.join(guess_signature(value) for value in [['test'], False, True]))
+        self.assertEqual('as', guess_signature([]))
+        self.assertEqual('(si)', guess_signature(('test', 1)))
+
+
+if __name__ == "__main__":
+    unittest.main()
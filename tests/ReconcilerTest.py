@@ -0,0 +1,95 @@
+import unittest
+from unittest import TestCase
+
+from systemd_dbus import UnitState, UnitStatus, plan_reconciliation
+
+
+class ReconcilerTest(TestCase):
+
+    def setUp(self):
+        print()
+
+    def test_returns_empty_plan_when_state_matches(self):
+        # Given
+        desired_state = {'test.service': UnitState(enabled=True, masked=False, active=True)}
+        current_state = {'test.service': UnitStatus('test.service', 'loaded', 'active', 'running', 'enabled')}
+
+        # When
+        plan = plan_reconciliation(desired_state, current_state)
+
+        # Then
+        self.assertTrue(plan.is_empty())
+        self.assertEqual([], plan.reports['test.service'].actions)
+        self.assertTrue(plan.reports['test.service'].success)
+
+    def test_returns_operations_in_apply_order(self):
+        # Given
+        desired_state = {
+            'test1.service': UnitState(enabled=True, masked=False, active=True),
+            'test2.service': UnitState(enabled=False, active=False),
+            'test3.service': UnitState(masked=True)
+        }
+        current_state = {
+            'test1.service': UnitStatus('test1.service', 'masked', 'inactive', 'dead', 'masked'),
+            'test2.service': UnitStatus('test2.service', 'loaded', 'active', 'running', 'enabled'),
+            'test3.service': UnitStatus('test3.service', 'loaded', 'inactive', 'dead', 'disabled')
+        }
+
+        # When
+        plan = plan_reconciliation(desired_state, current_state)
+
+        # Then
+        self.assertEqual([('unmask', ['test1.service']), ('disable', ['test2.service']),
+                          ('enable', ['test1.service']), ('mask', ['test3.service'])], plan.file_operations())
+        self.assertEqual([('stop', ['test2.service']), ('start', ['test1.service'])], plan.job_operations())
+        self.assertEqual(['unmask', 'enable', 'start'], plan.reports['test1.service'].actions)
+
+    def test_does_not_enable_statically_enabled_unit(self):
+        # Given
+        desired_state = {'test.service': UnitState(enabled=True)}
+        current_state = {'test.service': UnitStatus('test.service', 'loaded', 'inactive', 'dead', 'static')}
+
+        # When
+        plan = plan_reconciliation(desired_state, current_state)
+
+        # Then
+        self.assertTrue(plan.is_empty())
+
+    def test_reports_failure_when_starting_masked_unit(self):
+        # Given
+        desired_state = {'test.service': UnitState(masked=True, active=True)}
+        current_state = {'test.service': UnitStatus('test.service', 'loaded', 'inactive', 'dead', 'disabled')}
+
+        # When
+        plan = plan_reconciliation(desired_state, current_state)
+
+        # Then
+        self.assertTrue(plan.is_empty())
+        self.assertFalse(plan.reports['test.service'].success)
+        self.assertEqual('cannot start masked unit', plan.reports['test.service'].error)
+
+    def test_reports_failure_when_unit_not_found(self):
+        # Given
+        desired_state = {'test.service': UnitState(enabled=True)}
+
+        # When
+        plan = plan_reconciliation(desired_state, {})
+
+        # Then
+        self.assertTrue(plan.is_empty())
+        self.assertEqual('unit not found', plan.reports['test.service'].error)
+
+    def test_masks_unit_not_found(self):
+        # Given
+        desired_state = {'test.service': UnitState(masked=True)}
+
+        # When
+        plan = plan_reconciliation(desired_state, {})
+
+        # Then
+        self.assertEqual([('mask', ['test.service'])], plan.file_operations())
+        self.assertTrue(plan.reports['test.service'].success)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from context_logger import setup_logging
+
+from systemd_dbus import (SystemdDbus, InMemoryTransport, SignalRecorder, SignalReplayer, ReplayReport,
+                          read_signals)
+
+PROPERTIES_INTERFACE = 'org.freedesktop.DBus.Properties'
+MANAGER_INTERFACE = 'org.freedesktop.systemd1.Manager'
+UNIT_INTERFACE = 'org.freedesktop.systemd1.Unit'
+NGINX_PATH = '/org/freedesktop/systemd1/unit/nginx_2eservice'
+MANAGER_PATH = '/org/freedesktop/systemd1'
+
+
+class SignalReplayTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        setup_logging('systemd-dbus', warn_on_overwrite=False)
+
+    def setUp(self):
+        print()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, 'signals.rec')
+
+    def test_records_signals(self):
+        # Given
+        transport = InMemoryTransport()
+        subscribe = MagicMock()
+        transport.add_method(MANAGER_INTERFACE, 'Subscribe', subscribe)
+        transport.add_method(MANAGER_INTERFACE, 'Unsubscribe', MagicMock())
+
+        # When
+        with SignalRecorder(transport, self.path) as recorder:
+            transport.emit_signal(NGINX_PATH, PROPERTIES_INTERFACE, 'PropertiesChanged', UNIT_INTERFACE,
+                                  {'ActiveState': 'active'}, [])
+            transport.emit_signal(MANAGER_PATH, MANAGER_INTERFACE, 'JobRemoved', 12, '/job/12', 'nginx.service',
+                                  'done')
+            transport.emit_signal(MANAGER_PATH, MANAGER_INTERFACE, 'UnitRemoved', 'nginx.service', NGINX_PATH)
+
+        # Then
+        subscribe.assert_called_once()
+        self.assertEqual(2, recorder.count)
+        result = list(read_signals(self.path))
+        self.assertEqual([(NGINX_PATH, 'PropertiesChanged', (UNIT_INTERFACE, {'ActiveState': 'active'}, [])),
+                          (MANAGER_PATH, 'JobRemoved', (12, '/job/12', 'nginx.service', 'done'))],
+                         [(signal.path, signal.signal_name, signal.args) for signal in result])
+        self.assertLessEqual(result[0].offset, result[1].offset)
+        self.assertEqual(0, transport.emit_signal(NGINX_PATH, PROPERTIES_INTERFACE, 'PropertiesChanged',
+                                                  UNIT_INTERFACE, {}, []))
+
+    def test_replays_signals_into_registered_handlers(self):
+        # Given
+        self._record_signals(10)
+        transport = InMemoryTransport()
+        systemd = SystemdDbus(transport=transport)
+        handler = MagicMock()
+        systemd.add_property_change_handler(NGINX_PATH, handler)
+        replayer = SignalReplayer(self.path)
+
+        # When
+        result = replayer.replay(transport, speed=None)
+
+        # Then
+        self.assertEqual(10, result.signals)
+        self.assertEqual(10, result.handler_calls)
+        self.assertEqual(0, result.errors)
+        self.assertEqual(10, handler.call_count)
+        handler.assert_called_with(UNIT_INTERFACE, {'NRestarts': 9}, [])
+        self.assertEqual({'p50', 'p90', 'p99', 'max'}, set(result.get_latency_percentiles()))
+
+    def test_replays_with_recorded_timing_scaled_by_speed(self):
+        # Given
+        self._record_signals(2, interval=0.2)
+        replayer = SignalReplayer(self.path)
+
+        # When
+        result = replayer.replay(InMemoryTransport(), speed=4)
+
+        # Then
+        self.assertEqual(2, result.signals)
+        self.assertGreaterEqual(result.duration, 0.05)
+        self.assertLess(result.duration, 0.2)
+
+    def test_counts_handler_errors(self):
+        # Given
+        self._record_signals(3)
+        transport = InMemoryTransport()
+        handler = MagicMock()
+        transport.add_signal_receiver(MagicMock(side_effect=RuntimeError('failed')), 'PropertiesChanged',
+                                      PROPERTIES_INTERFACE)
+        transport.add_signal_receiver(handler, 'PropertiesChanged', PROPERTIES_INTERFACE)
+
+        # When
+        result = SignalReplayer(self.path).replay(transport, speed=None)
+
+        # Then
+        self.assertEqual(3, result.signals)
+        self.assertEqual(6, result.handler_calls)
+        self.assertEqual(3, result.errors)
+        self.assertEqual(3, handler.call_count)
+
+    def test_raises_error_when_not_a_recording(self):
+        # Given
+        with open(self.path, 'wb') as file:
+            file.write(b'not a recording')
+
+        # When, Then
+        with self.assertRaises(ValueError):
+            SignalReplayer(self.path)
+
+    def test_calculates_latency_percentiles(self):
+        # Given
+        report = ReplayReport(signals=100, duration=2.0, latencies=[index / 1000 for index in range(100, 0, -1)])
+
+        # Then
+        self.assertEqual(50.0, report.throughput)
+        self.assertEqual(0.05, report.get_latency(50))
+        self.assertEqual(0.099, report.get_latency(99))
+        self.assertEqual(0.1, report.get_latency(100))
+        self.assertEqual(0.001, report.get_latency(0))
+
+    def _record_signals(self, count, interval=0.0):
+        transport = InMemoryTransport()
+        with SignalRecorder(transport, self.path):
+            for index in range(count):
+                transport.emit_signal(NGINX_PATH, PROPERTIES_INTERFACE, 'PropertiesChanged', UNIT_INTERFACE,
+                                      {'NRestarts': index}, [])
+                time.sleep(interval)
+
+
+if __name__ == '__main__':
+    unittest.main()
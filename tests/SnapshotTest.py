@@ -0,0 +1,226 @@
+import os
+import tempfile
+import unittest
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from context_logger import setup_logging
+
+from systemd_dbus import (Systemd, SnapshotReader, SnapshotRecorder, UnitEvent, UnitEventStream, write_snapshot,
+                          diff_snapshots, apply_delta)
+
+PROPERTIES = ['ActiveState', 'SubState', 'NRestarts', 'ExecMainStartTimestamp', 'Requires', 'Conditions']
+UNITS = {
+    'nginx.service': {
+        'ActiveState': 'active',
+        'SubState': 'running',
+        'NRestarts': 2,
+        'ExecMainStartTimestamp': 2 ** 64 - 1,
+        'Requires': ['network.target', 'sysinit.target'],
+        'Conditions': [('ConditionPathExists', False, False, '/etc/nginx', 1)]
+    },
+    'network.target': {'ActiveState': 'active', 'SubState': 'active', 'Requires': []}
+}
+
+
+class SnapshotTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        setup_logging('systemd-dbus', warn_on_overwrite=False)
+
+    def setUp(self):
+        print()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_reads_back_written_snapshot(self):
+        # Given
+        path = os.path.join(self.directory.name, 'test.snap')
+
+        # When
+        write_snapshot(path, UNITS, PROPERTIES, 1000.5)
+
+        # Then
+        with SnapshotReader(path) as reader:
+            self.assertFalse(reader.is_delta)
+            self.assertEqual(1000.5, reader.timestamp)
+            self.assertEqual(['nginx.service', 'network.target'], reader.unit_names)
+            self.assertEqual(PROPERTIES, reader.properties)
+            self.assertEqual(UNITS, reader.to_dict())
+            self.assertEqual('running', reader.get('nginx.service', 'SubState'))
+            self.assertIsNone(reader.get('network.target', 'NRestarts'))
+            self.assertIsNone(reader.get('unknown.service', 'SubState'))
+
+    def test_raises_error_when_not_a_snapshot(self):
+        # Given
+        path = os.path.join(self.directory.name, 'test.snap')
+        with open(path, 'wb') as file:
+            file.write(b'\0' * 64)
+
+        # When, Then
+        with self.assertRaises(ValueError):
+            SnapshotReader(path)
+
+    def test_diffs_snapshots(self):
+        # Given
+        old_path = os.path.join(self.directory.name, 'old.snap')
+        new_path = os.path.join(self.directory.name, 'new.snap')
+        new_units = {
+            'nginx.service': dict(UNITS['nginx.service'], ActiveState='failed', SubState='failed'),
+            'sshd.service': {'ActiveState': 'active'}
+        }
+        write_snapshot(old_path, UNITS, PROPERTIES)
+        write_snapshot(new_path, new_units, PROPERTIES)
+
+        # When
+        with SnapshotReader(old_path) as old, SnapshotReader(new_path) as new:
+            result = diff_snapshots(old, new)
+
+        # Then
+        self.assertEqual(['sshd.service'], result.added_units)
+        self.assertEqual(['network.target'], result.removed_units)
+        self.assertEqual({'nginx.service': {'ActiveState': ('active', 'failed'), 'SubState': ('running', 'failed')}},
+                         result.changed)
+
+    def test_diff_is_empty_for_equal_snapshots(self):
+        # Given
+        old_path = os.path.join(self.directory.name, 'old.snap')
+        new_path = os.path.join(self.directory.name, 'new.snap')
+        write_snapshot(old_path, UNITS, PROPERTIES)
+        write_snapshot(new_path, dict(reversed(UNITS.items())), PROPERTIES)
+
+        # When
+        with SnapshotReader(old_path) as old, SnapshotReader(new_path) as new:
+            result = diff_snapshots(old, new)
+
+        # Then
+        self.assertTrue(result.is_empty())
+
+    def test_writes_deltas_from_events_between_snapshots(self):
+        # Given
+        stream = UnitEventStream()
+        systemd = MagicMock(spec=Systemd)
+        systemd.get_units_properties.return_value = UNITS
+        systemd.stream_unit_events.return_value = stream
+        recorder = SnapshotRecorder(systemd, self.directory.name, PROPERTIES)
+
+        with recorder:
+            snapshot_path = recorder.take_snapshot()
+            stream.put(UnitEvent('nginx.service', 'org.freedesktop.systemd1.Unit',
+                                 {'ActiveState': 'failed', 'StateChangeTimestamp': 1}))
+            stream.put(UnitEvent('nginx.service', 'org.freedesktop.systemd1.Service', {'NRestarts': 3}))
+
+            # When
+            delta_path = recorder.take_delta()
+
+        # Then
+        with SnapshotReader(snapshot_path) as snapshot, SnapshotReader(delta_path) as delta:
+            self.assertTrue(delta.is_delta)
+            self.assertEqual(['nginx.service'], delta.unit_names)
+            self.assertEqual({'ActiveState': 'failed'}, delta.get_unit('nginx.service'))
+            result = apply_delta(snapshot.to_dict(), delta)
+
+        self.assertEqual('failed', result['nginx.service']['ActiveState'])
+        self.assertEqual(2, result['nginx.service']['NRestarts'])
+        self.assertTrue(stream.closed)
+        systemd.subscribe_to_property_changes.assert_called_once()
+        systemd.unsubscribe_from_property_changes.assert_called_once()
+
+    def test_takes_full_snapshot_when_events_were_dropped(self):
+        # Given
+        stream = UnitEventStream(max_size=1)
+        systemd = MagicMock(spec=Systemd)
+        systemd.get_units_properties.return_value = UNITS
+        systemd.stream_unit_events.return_value = stream
+        recorder = SnapshotRecorder(systemd, self.directory.name, PROPERTIES)
+        recorder.start()
+        stream.put(UnitEvent('nginx.service', 'org.freedesktop.systemd1.Unit', {'ActiveState': 'failed'}))
+        stream.put(UnitEvent('nginx.service', 'org.freedesktop.systemd1.Unit', {'ActiveState': 'active'}))
+
+        # When
+        path = recorder.take_delta()
+
+        # Then
+        with SnapshotReader(path) as reader:
+            self.assertFalse(reader.is_delta)
+            self.assertEqual(UNITS, reader.to_dict())
+
+    def test_reads_invalidated_properties_when_taking_delta(self):
+        # Given
+        stream = UnitEventStream()
+        systemd = MagicMock(spec=Systemd)
+        systemd.get_units_properties.side_effect = [UNITS, {'nginx.service': {'ActiveState': 'active',
+                                                                              'SubState': 'auto-restart'}}]
+        systemd.stream_unit_events.return_value = stream
+        recorder = SnapshotRecorder(systemd, self.directory.name, PROPERTIES)
+
+        with recorder:
+            recorder.take_snapshot()
+            stream.put(UnitEvent('nginx.service', 'org.freedesktop.systemd1.Unit', {'ActiveState': 'activating'},
+                                 invalidated=['SubState', 'Description']))
+
+            # When
+            path = recorder.take_delta()
+
+        # Then
+        systemd.get_units_properties.assert_called_with(PROPERTIES, ['nginx.service'],
+                                                        'org.freedesktop.systemd1.Unit')
+        with SnapshotReader(path) as delta:
+            self.assertTrue(delta.is_delta)
+            self.assertEqual({'ActiveState': 'activating', 'SubState': 'auto-restart'},
+                             delta.get_unit('nginx.service'))
+
+    def test_takes_full_snapshot_when_invalidated_properties_can_not_be_read(self):
+        # Given
+        stream = UnitEventStream()
+        systemd = MagicMock(spec=Systemd)
+        systemd.get_units_properties.side_effect = [UNITS, None, UNITS]
+        systemd.stream_unit_events.return_value = stream
+        recorder = SnapshotRecorder(systemd, self.directory.name, PROPERTIES)
+
+        with recorder:
+            recorder.take_snapshot()
+            stream.put(UnitEvent('nginx.service', 'org.freedesktop.systemd1.Unit', invalidated=['SubState']))
+
+            # When
+            path = recorder.take_delta()
+
+        # Then
+        with SnapshotReader(path) as reader:
+            self.assertFalse(reader.is_delta)
+            self.assertEqual(UNITS, reader.to_dict())
+
+    def test_raises_error_when_fails_to_stream_unit_events(self):
+        # Given
+        systemd = MagicMock(spec=Systemd)
+        systemd.stream_unit_events.return_value = None
+
+        # When
+        with self.assertRaises(RuntimeError):
+            with SnapshotRecorder(systemd, self.directory.name, PROPERTIES):
+                pass
+
+        # Then
+        systemd.subscribe_to_property_changes.assert_not_called()
+
+    def test_closes_stream_when_fails_to_subscribe(self):
+        # Given
+        stream = UnitEventStream()
+        systemd = MagicMock(spec=Systemd)
+        systemd.stream_unit_events.return_value = stream
+        systemd.subscribe_to_property_changes.return_value = False
+        recorder = SnapshotRecorder(systemd, self.directory.name, PROPERTIES)
+
+        # When
+        result = recorder.start()
+
+        # Then
+        self.assertFalse(result)
+        self.assertTrue(stream.closed)
+        self.assertIsNone(recorder.take_delta())
+        systemd.unsubscribe_from_property_changes.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,240 @@
+import os
+import socket
+import tempfile
+import time
+import unittest
+from threading import Thread, Event
+from unittest import TestCase
+
+from context_logger import setup_logging
+
+from systemd_dbus import SocketTransport, TransportError
+from systemd_dbus.message import Message, METHOD_CALL, METHOD_RETURN, ERROR, SIGNAL
+
+
+class FakeBus(object):
+
+    def __init__(self, socket_path, hello_delay=0):
+        self.calls = []
+        self._hello_delay = hello_delay
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(socket_path)
+        self._server.listen(1)
+        self._connection = None
+        Thread(target=self._serve, daemon=True).start()
+
+    def close(self):
+        self._server.close()
+        if self._connection:
+            self._connection.close()
+
+    def _serve(self):
+        while True:
+            try:
+                self._connection, _ = self._server.accept()
+            except OSError:
+                return
+            self._serve_connection()
+
+    def _serve_connection(self):
+        reader = self._connection.makefile('rb')
+        reader.readline()
+        self._connection.sendall(b'OK 0123456789abcdef\r\n')
+        reader.readline()
+
+        registered = False
+        while prefix := reader.read(16):
+            message = Message.unmarshal(prefix + reader.read(Message.get_size(prefix) - 16))
+            if message.message_type == METHOD_CALL:
+                self.calls.append((message.member, message.signature, message.body))
+                if message.member == 'Hello':
+                    time.sleep(self._hello_delay)
+                    registered = True
+                self._reply(message, registered)
+                if message.member == 'Disconnect':
+                    self._connection.close()
+                    return
+
+    def _reply(self, message, registered):
+        replies = {
+            'Hello': ('s', [':1.42']),
+            'GetNameOwner': ('s', [':1.1']),
+            'GetUnitFileState': ('s', ['enabled'])
+        }
+
+        if not registered:
+            reply = Message(ERROR, 1, error_name='org.freedesktop.DBus.Error.AccessDenied',
+                            reply_serial=message.serial, signature='s',
+                            body=['Client tried to send a message other than Hello without being registered'])
+        elif message.member == 'Fail':
+            reply = Message(ERROR, 1, error_name='org.freedesktop.systemd1.NoSuchUnit', reply_serial=message.serial,
+                            signature='s', body=['Unit test.service not found.'])
+        else:
+            signature, body = replies.get(message.member, ('', []))
+            reply = Message(METHOD_RETURN, 1, reply_serial=message.serial, signature=signature, body=body)
+
+        self._connection.sendall(reply.marshal())
+
+        if message.member == 'AddMatch':
+            self._send_signal('active')
+        if message.member == 'Storm':
+            for sub_state in message.body[0]:
+                self._send_signal(sub_state)
+
+    def _send_signal(self, active_state):
+        self._connection.sendall(Message(
+            SIGNAL, 2, '/org/freedesktop/systemd1/unit/test_2eservice', 'org.freedesktop.DBus.Properties',
+            'PropertiesChanged', sender=':1.1', signature='sa{sv}as',
+            body=['org.freedesktop.systemd1.Unit', {'ActiveState': active_state}, []]).marshal())
+
+
+class SocketTransportTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        setup_logging('systemd-dbus', warn_on_overwrite=False)
+
+    def setUp(self):
+        print()
+        self._directory = tempfile.TemporaryDirectory()
+        self.address = f'unix:path={os.path.join(self._directory.name, "bus")}'
+        self.bus = FakeBus(os.path.join(self._directory.name, 'bus'))
+        self.transport = SocketTransport(self.address, timeout=5)
+
+    def tearDown(self):
+        self.transport.close()
+        self.bus.close()
+        self._directory.cleanup()
+
+    def test_calls_method(self):
+        # When
+        result = self.transport.call_method('org.freedesktop.systemd1', '/org/freedesktop/systemd1',
+                                            'org.freedesktop.systemd1.Manager', 'GetUnitFileState', 'test.service')
+
+        # Then
+        self.assertEqual('enabled', result)
+        self.assertEqual(':1.42', self.transport.unique_name)
+        self.assertEqual([('Hello', '', []), ('GetUnitFileState', 's', ['test.service'])], self.bus.calls)
+
+    def test_guesses_argument_signature(self):
+        # When
+        result = self.transport.call_method('org.freedesktop.systemd1', '/org/freedesktop/systemd1',
+                                            'org.freedesktop.systemd1.Manager', 'EnableUnitFiles',
+                                            ['test.service'], False, True)
+
+        # Then
+        self.assertIsNone(result)
+        self.assertEqual(('EnableUnitFiles', 'asbb', [['test.service'], False, True]), self.bus.calls[-1])
+
+    def test_raises_error_when_error_reply_received(self):
+        # When
+        with self.assertRaises(TransportError) as context:
+            self.transport.call_method('org.freedesktop.systemd1', '/org/freedesktop/systemd1',
+                                       'org.freedesktop.systemd1.Manager', 'Fail')
+
+        # Then
+        self.assertEqual('org.freedesktop.systemd1.NoSuchUnit', context.exception.name)
+
+    def test_dispatches_signal_to_receiver(self):
+        # Given
+        received = []
+        dispatched = Event()
+
+        def handler(*args, **kwargs):
+            received.append((args, kwargs))
+            dispatched.set()
+
+        # When
+        self.transport.add_signal_receiver(handler, 'PropertiesChanged', 'org.freedesktop.DBus.Properties',
+                                           'org.freedesktop.systemd1', path_keyword='path')
+
+        # Then
+        self.assertTrue(dispatched.wait(5))
+        self.assertEqual([(('org.freedesktop.systemd1.Unit', {'ActiveState': 'active'}, []),
+                           {'path': '/org/freedesktop/systemd1/unit/test_2eservice'})], received)
+        self.assertEqual(('AddMatch', 's', ["type='signal',interface='org.freedesktop.DBus.Properties',"
+                                            "member='PropertiesChanged',sender='org.freedesktop.systemd1'"]),
+                         self.bus.calls[-1])
+
+    def test_reconnects_when_connection_is_closed_by_bus(self):
+        # Given
+        self.transport.call_method('org.freedesktop.systemd1', '/', 'org.freedesktop.systemd1.Manager', 'Disconnect')
+        deadline = time.monotonic() + 5
+        while self.transport.unique_name is not None and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        # When
+        results = [self.transport.call_method('org.freedesktop.systemd1', '/org/freedesktop/systemd1',
+                                              'org.freedesktop.systemd1.Manager', 'GetUnitFileState', 'test.service')
+                   for _ in range(2)]
+
+        # Then
+        self.assertEqual(['enabled', 'enabled'], results)
+        self.assertEqual(['Hello', 'Disconnect', 'Hello', 'GetUnitFileState', 'GetUnitFileState'],
+                         [call[0] for call in self.bus.calls])
+
+    def test_sends_concurrent_calls_only_after_hello(self):
+        # Given
+        self.transport.close()
+        self.bus.close()
+        socket_path = os.path.join(self._directory.name, 'slow-bus')
+        self.bus = FakeBus(socket_path, hello_delay=0.05)
+        self.transport = SocketTransport(f'unix:path={socket_path}', timeout=5)
+        results = []
+
+        def call():
+            results.append(self.transport.call_method('org.freedesktop.systemd1', '/org/freedesktop/systemd1',
+                                                      'org.freedesktop.systemd1.Manager', 'GetUnitFileState',
+                                                      'test.service'))
+
+        # When
+        threads = [Thread(target=call) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+
+        # Then
+        self.assertEqual(['enabled'] * 8, results)
+        self.assertEqual(['Hello'] + ['GetUnitFileState'] * 8, [call[0] for call in self.bus.calls])
+
+    def test_dispatches_all_signals_when_signal_queue_is_full(self):
+        # Given
+        self.transport.close()
+        self.transport = SocketTransport(self.address, timeout=5, max_queued_signals=1)
+        received = []
+        released = Event()
+        dispatched = Event()
+
+        def handler(interface, changed, invalidated):
+            released.wait(5)
+            received.append(changed['ActiveState'])
+            if len(received) == 6:
+                dispatched.set()
+
+        self.transport.add_signal_receiver(handler, 'PropertiesChanged', 'org.freedesktop.DBus.Properties',
+                                           ':1.1')
+
+        # When
+        self.transport.call_method('org.freedesktop.systemd1', '/', 'org.freedesktop.systemd1.Manager', 'Storm',
+                                   ['reloading', 'activating', 'deactivating', 'inactive', 'failed'])
+        released.set()
+
+        # Then
+        self.assertTrue(dispatched.wait(5))
+        self.assertEqual(['active', 'reloading', 'activating', 'deactivating', 'inactive', 'failed'], received)
+
+    def test_raises_error_when_fails_to_connect(self):
+        # Given
+        transport = SocketTransport('unix:path=/nonexistent/bus')
+
+        # When
+        with self.assertRaises(TransportError) as context:
+            transport.call_method('org.freedesktop.systemd1', '/', 'org.freedesktop.systemd1.Manager', 'Reload')
+
+        # Then
+        self.assertEqual('org.freedesktop.DBus.Error.Disconnected', context.exception.name)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+from threading import Timer
+from unittest import TestCase
+
+from systemd_dbus import StateBarrier
+
+
+class StateBarrierTest(TestCase):
+
+    def setUp(self):
+        print()
+
+    def test_returns_success_when_all_units_reached_target_state(self):
+        # Given
+        barrier = StateBarrier({'test1.service': 'active', 'test2.service': 'inactive'})
+        barrier.update('test1.service', 'active')
+        barrier.update('test2.service', 'inactive')
+
+        # When
+        result = barrier.wait(0)
+
+        # Then
+        self.assertTrue(result.success)
+        self.assertEqual([], result.pending)
+
+    def test_returns_when_unit_reaches_target_state_while_waiting(self):
+        # Given
+        barrier = StateBarrier({'test.service': 'active'})
+        barrier.update('test.service', 'activating')
+        Timer(0.05, barrier.update, ['test.service', 'active']).start()
+
+        # When
+        result = barrier.wait(5)
+
+        # Then
+        self.assertTrue(result.success)
+        self.assertEqual({'test.service': 'active'}, result.states)
+
+    def test_keeps_received_state_when_updated_only_if_unset(self):
+        # Given
+        barrier = StateBarrier({'test1.service': 'active', 'test2.service': 'active'})
+        barrier.update('test1.service', 'active')
+
+        # When
+        barrier.update('test1.service', 'activating', only_if_unset=True)
+        barrier.update('test2.service', 'active', only_if_unset=True)
+
+        # Then
+        self.assertEqual({'test1.service': 'active', 'test2.service': 'active'}, barrier.wait(0).states)
+
+    def test_returns_early_when_unit_failed(self):
+        # Given
+        barrier = StateBarrier({'test1.service': 'active', 'test2.service': 'active'})
+        barrier.update('test1.service', 'failed')
+
+        # When
+        result = barrier.wait(5)
+
+        # Then
+        self.assertFalse(result.success)
+        self.assertEqual(['test1.service'], result.failed)
+        self.assertEqual(['test1.service', 'test2.service'], result.pending)
+
+    def test_returns_pending_units_when_timed_out(self):
+        # Given
+        barrier = StateBarrier({'test1.service': 'active', 'test2.service': 'active'})
+        barrier.update('test1.service', 'active')
+        barrier.update('test2.service', 'activating')
+
+        # When
+        result = barrier.wait(0.05)
+
+        # Then
+        self.assertFalse(result.success)
+        self.assertEqual(['test2.service'], result.pending)
+        self.assertEqual([], result.failed)
+
+    def test_ignores_unknown_units(self):
+        # Given
+        barrier = StateBarrier({'test.service': 'active'})
+
+        # When
+        barrier.update('other.service', 'active')
+
+        # Then
+        self.assertEqual({'test.service': None}, barrier.wait(0).states)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,12 +1,13 @@
 import unittest
+from threading import Timer, Barrier
 from unittest import TestCase
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, DEFAULT
 
 import dbus
 from context_logger import setup_logging
 from dbus import DBusException
 
-from systemd_dbus import SystemdDbus
+from systemd_dbus import SystemdDbus, UnitState, InMemoryTransport, UnitEventStream
 
 
 class SystemdDbusTest(TestCase):
@@ -574,6 +575,590 @@ class SystemdDbusTest(TestCase):
         system_bus.get_object.assert_called_with('org.freedesktop.systemd1', '/org/freedesktop/systemd1')
         system_bus.get_object().get_dbus_method.assert_called_with('Reload', 'org.freedesktop.systemd1.Manager')
 
+    def test_returns_unit_states(self):
+        # Given
+        system_bus, methods = create_system_bus({
+            'ListUnitsByNames': [
+                ('test1.service', 'Test 1', 'loaded', 'active', 'running', '', '/unit/test1', 0, '', '/'),
+                ('test2.service', 'Test 2', 'not-found', 'inactive', 'dead', '', '/unit/test2', 0, '', '/')
+            ],
+            'ListUnitFilesByPatterns': [('/lib/systemd/system/test1.service', 'enabled')]
+        })
+        systemd = SystemdDbus(system_bus)
+
+        # When
+        result = systemd.get_unit_states(['test1', 'test2.service'])
+
+        # Then
+        self.assertEqual('active', result['test1.service'].active_state)
+        self.assertEqual('enabled', result['test1.service'].file_state)
+        self.assertEqual('not-found', result['test2.service'].load_state)
+        self.assertIsNone(result['test2.service'].file_state)
+        methods['ListUnitsByNames'].assert_called_once_with(['test1.service', 'test2.service'])
+        methods['ListUnitFilesByPatterns'].assert_called_once_with([], ['test1.service', 'test2.service'])
+
+    def test_reads_file_state_of_template_instances_not_listed_as_unit_files(self):
+        # Given
+        system_bus, methods = create_system_bus({
+            'ListUnitsByNames': [
+                ('worker@1.service', 'Worker 1', 'loaded', 'active', 'running', '', '/unit/worker_401', 0, '', '/'),
+                ('test.service', 'Test', 'loaded', 'active', 'running', '', '/unit/test', 0, '', '/')
+            ],
+            'ListUnitFilesByPatterns': [('/lib/systemd/system/test.service', 'enabled')],
+            'GetUnitFileState': 'enabled'
+        })
+        systemd = SystemdDbus(system_bus)
+
+        # When
+        result = systemd.reconcile({'worker@1': UnitState(enabled=True, active=True),
+                                    'test': UnitState(enabled=True, active=True)}, dry_run=True)
+
+        # Then
+        self.assertEqual([], result['worker@1.service'].actions)
+        self.assertEqual([], result['test.service'].actions)
+        methods['GetUnitFileState'].assert_called_once_with('worker@1.service')
+
+    def test_returns_none_when_fails_to_get_unit_states(self):
+        # Given
+        system_bus = MagicMock(spec=dbus.SystemBus)
+        system_bus.get_object().get_dbus_method().side_effect = DBusException('Failure')
+        systemd = SystemdDbus(system_bus)
+
+        # When
+        result = systemd.get_unit_states(['test'])
+
+        # Then
+        self.assertIsNone(result)
+
+    def test_reconcile_returns_plan_without_applying_when_dry_run(self):
+        # Given
+        system_bus, methods = create_system_bus({
+            'ListUnitsByNames': [('test.service', 'Test', 'loaded', 'inactive', 'dead', '', '/unit/test', 0, '', '/')],
+            'ListUnitFilesByPatterns': [('/lib/systemd/system/test.service', 'disabled')]
+        })
+        systemd = SystemdDbus(system_bus)
+
+        # When
+        result = systemd.reconcile({'test': UnitState(enabled=True, active=True)}, dry_run=True)
+
+        # Then
+        self.assertEqual(['enable', 'start'], result['test.service'].actions)
+        self.assertTrue(result['test.service'].success)
+        self.assertNotIn('EnableUnitFiles', methods)
+        self.assertNotIn('StartUnit', methods)
+
+    def test_reconcile_applies_batched_file_operations_and_waits_for_jobs(self):
+        # Given
+        system_bus, methods = create_system_bus({
+            'ListUnitsByNames': [
+                ('test1.service', 'Test 1', 'loaded', 'inactive', 'dead', '', '/unit/test1', 0, '', '/'),
+                ('test2.service', 'Test 2', 'loaded', 'active', 'running', '', '/unit/test2', 0, '', '/')
+            ],
+            'ListUnitFilesByPatterns': [
+                ('/lib/systemd/system/test1.service', 'disabled'),
+                ('/lib/systemd/system/test2.service', 'enabled')
+            ]
+        })
+        methods['ListUnitsByNames'].side_effect = [
+            methods['ListUnitsByNames'].return_value,
+            [('test1.service', 'Test 1', 'loaded', 'active', 'running', '', '/unit/test1', 0, '', '/'),
+             ('test2.service', 'Test 2', 'loaded', 'inactive', 'dead', '', '/unit/test2', 0, '', '/')]
+        ]
+        systemd = SystemdDbus(system_bus)
+
+        # When
+        result = systemd.reconcile({
+            'test1': UnitState(enabled=True, active=True),
+            'test2': UnitState(enabled=False, active=False),
+        })
+
+        # Then
+        self.assertTrue(result['test1.service'].success)
+        self.assertTrue(result['test2.service'].success)
+        methods['EnableUnitFiles'].assert_called_once_with(['test1.service'], False, True)
+        methods['DisableUnitFiles'].assert_called_once_with(['test2.service'], False)
+        methods['Reload'].assert_called_once()
+        methods['StartUnit'].assert_called_once_with('test1.service', 'replace')
+        methods['StopUnit'].assert_called_once_with('test2.service', 'replace')
+
+    def test_reconcile_queues_jobs_concurrently(self):
+        # Given
+        system_bus, methods = create_system_bus({
+            'ListUnitsByNames': [
+                ('test1.service', 'Test 1', 'loaded', 'inactive', 'dead', '', '/unit/test1', 0, '', '/'),
+                ('test2.service', 'Test 2', 'loaded', 'inactive', 'dead', '', '/unit/test2', 0, '', '/')
+            ],
+            'ListUnitFilesByPatterns': [
+                ('/lib/systemd/system/test1.service', 'static'),
+                ('/lib/systemd/system/test2.service', 'static')
+            ],
+            'StartUnit': None
+        })
+        methods['ListUnitsByNames'].side_effect = [
+            methods['ListUnitsByNames'].return_value,
+            [('test1.service', 'Test 1', 'loaded', 'active', 'running', '', '/unit/test1', 0, '', '/'),
+             ('test2.service', 'Test 2', 'loaded', 'active', 'running', '', '/unit/test2', 0, '', '/')]
+        ]
+        # Both jobs are queued only if the calls are in flight at the same time
+        barrier = Barrier(2, timeout=5)
+        methods['StartUnit'].side_effect = lambda *args: barrier.wait()
+        systemd = SystemdDbus(system_bus)
+
+        # When
+        result = systemd.reconcile({'test1': UnitState(active=True), 'test2': UnitState(active=True)})
+
+        # Then
+        self.assertTrue(result['test1.service'].success)
+        self.assertTrue(result['test2.service'].success)
+        self.assertEqual(2, methods['StartUnit'].call_count)
+
+    def test_reconcile_reports_failure_when_unit_does_not_reach_desired_state(self):
+        # Given
+        system_bus, methods = create_system_bus({
+            'ListUnitsByNames': [('test.service', 'Test', 'loaded', 'inactive', 'dead', '', '/unit/test', 0, '', '/')],
+            'ListUnitFilesByPatterns': [('/lib/systemd/system/test.service', 'enabled')]
+        })
+        methods['ListUnitsByNames'].side_effect = [
+            methods['ListUnitsByNames'].return_value,
+            [('test.service', 'Test', 'loaded', 'failed', 'failed', '', '/unit/test', 0, '', '/')]
+        ]
+        systemd = SystemdDbus(system_bus)
+
+        # When
+        result = systemd.reconcile({'test': UnitState(active=True)})
+
+        # Then
+        self.assertFalse(result['test.service'].success)
+        self.assertEqual('unit is failed', result['test.service'].error)
+        self.assertNotIn('Reload', methods)
+
+    def test_reconcile_accepts_successfully_finished_oneshot_service(self):
+        # Given
+        system_bus, methods = create_system_bus({
+            'ListUnitsByNames': [('test.service', 'Test', 'loaded', 'inactive', 'dead', '', '/unit/test', 0, '', '/')],
+            'ListUnitFilesByPatterns': [('/lib/systemd/system/test.service', 'static')],
+            'GetAll': {'Type': 'oneshot', 'Result': 'success', 'ExecMainStatus': 0}
+        })
+        systemd = SystemdDbus(system_bus)
+
+        # When
+        result = systemd.reconcile({'test': UnitState(active=True)})
+
+        # Then
+        self.assertTrue(result['test.service'].success)
+        methods['StartUnit'].assert_called_once_with('test.service', 'replace')
+        methods['GetAll'].assert_called_once_with('org.freedesktop.systemd1.Service')
+
+    def test_wait_for_states_resolves_from_property_change_signals(self):
+        # Given
+        system_bus, methods = create_system_bus({
+            'ListUnitsByNames': [
+                ('test-1.service', 'Test 1', 'loaded', 'active', 'running', '', '/unit/test_2d1', 0, '', '/'),
+                ('test-2.service', 'Test 2', 'loaded', 'activating', 'start', '', '/unit/test_2d2', 1, 'start', '/')
+            ]
+        })
+        handlers = {}
+
+        def add_signal_receiver(handler, *args, path):
+            handlers[path] = handler
+            return DEFAULT
+
+        system_bus.add_signal_receiver.side_effect = add_signal_receiver
+        systemd = SystemdDbus(system_bus)
+        Timer(0.05, lambda: handlers['/org/freedesktop/systemd1/unit/test_2d2_2eservice'](
+            'org.freedesktop.systemd1.Unit', {'ActiveState': 'active'}, [])).start()
+
+        # When
+        result = systemd.wait_for_states({'test-1': 'active', 'test-2': 'active'}, 5)
+
+        # Then
+        self.assertTrue(result.success)
+        self.assertEqual({'test-1.service': 'active', 'test-2.service': 'active'}, result.states)
+        methods['ListUnitsByNames'].assert_called_once_with(['test-1.service', 'test-2.service'])
+        self.assertEqual(2, system_bus.add_signal_receiver.return_value.remove.call_count)
+
+    def test_wait_for_states_returns_early_when_unit_failed(self):
+        # Given
+        system_bus, methods = create_system_bus({
+            'ListUnitsByNames': [
+                ('test1.service', 'Test 1', 'loaded', 'failed', 'failed', '', '/unit/test1', 0, '', '/'),
+                ('test2.service', 'Test 2', 'loaded', 'activating', 'start', '', '/unit/test2', 1, 'start', '/')
+            ]
+        })
+        systemd = SystemdDbus(system_bus)
+
+        # When
+        result = systemd.wait_for_states({'test1': 'active', 'test2': 'active'}, 5)
+
+        # Then
+        self.assertFalse(result.success)
+        self.assertEqual(['test1.service'], result.failed)
+        self.assertEqual(['test1.service', 'test2.service'], result.pending)
+
+    def test_wait_for_states_returns_failure_when_fails_to_add_handler(self):
+        # Given
+        system_bus = MagicMock(spec=dbus.SystemBus)
+        system_bus.add_signal_receiver.side_effect = DBusException('Failure')
+        systemd = SystemdDbus(system_bus)
+
+        # When
+        result = systemd.wait_for_states({'test': 'active'}, 5)
+
+        # Then
+        self.assertFalse(result.success)
+        self.assertEqual(['test.service'], result.pending)
+
+    def test_wait_for_states_keeps_signal_received_during_bulk_read(self):
+        # Given
+        transport = InMemoryTransport()
+        unit_path = '/org/freedesktop/systemd1/unit/test_2eservice'
+
+        def list_units_by_names(names):
+            transport.emit_signal(unit_path, 'org.freedesktop.DBus.Properties', 'PropertiesChanged',
+                                  'org.freedesktop.systemd1.Unit', {'ActiveState': 'active'}, [])
+            return [('test.service', 'Test', 'loaded', 'activating', 'start', '', unit_path, 1, 'start', '/')]
+
+        transport.add_method('org.freedesktop.systemd1.Manager', 'ListUnitsByNames', list_units_by_names)
+        systemd = SystemdDbus(transport=transport)
+
+        # When
+        result = systemd.wait_for_states({'test': 'active'}, 0.1)
+
+        # Then
+        self.assertTrue(result.success)
+        self.assertEqual({'test.service': 'active'}, result.states)
+
+    def test_streams_unit_events_of_all_units(self):
+        # Given
+        system_bus = MagicMock(spec=dbus.SystemBus)
+        systemd = SystemdDbus(system_bus)
+
+        # When
+        stream = systemd.stream_unit_events(max_size=10)
+        handler = system_bus.add_signal_receiver.call_args.args[0]
+        handler('org.freedesktop.systemd1.Unit', dbus.Dictionary({'ActiveState': dbus.String('active')}),
+                dbus.Array([dbus.String('SubState')]), path='/org/freedesktop/systemd1/unit/test_2eservice')
+        handler('org.freedesktop.systemd1.Manager', {}, [], path='/org/freedesktop/systemd1')
+        stream.close()
+
+        # Then
+        events = list(stream)
+        self.assertEqual(1, len(events))
+        self.assertEqual('test.service', events[0].unit_name)
+        self.assertEqual({'ActiveState': 'active'}, events[0].changed)
+        self.assertIs(str, type(events[0].changed['ActiveState']))
+        self.assertEqual(['SubState'], events[0].invalidated)
+        system_bus.add_signal_receiver.assert_called_once_with(
+            handler, 'PropertiesChanged', 'org.freedesktop.DBus.Properties', bus_name='org.freedesktop.systemd1',
+            path_keyword='path')
+        system_bus.add_signal_receiver.return_value.remove.assert_called_once()
+
+    def test_streams_unit_events_of_selected_units(self):
+        # Given
+        system_bus = MagicMock(spec=dbus.SystemBus)
+        systemd = SystemdDbus(system_bus)
+
+        # When
+        stream = systemd.stream_unit_events(['test1', 'test2.service'])
+
+        # Then
+        self.assertIsNotNone(stream)
+        paths = [call.kwargs['path'] for call in system_bus.add_signal_receiver.call_args_list]
+        self.assertEqual(['/org/freedesktop/systemd1/unit/test1_2eservice',
+                          '/org/freedesktop/systemd1/unit/test2_2eservice'], paths)
+
+    def test_returns_none_when_fails_to_stream_unit_events(self):
+        # Given
+        system_bus = MagicMock(spec=dbus.SystemBus)
+        system_bus.add_signal_receiver.side_effect = DBusException('Failure')
+        systemd = SystemdDbus(system_bus)
+
+        # When
+        result = systemd.stream_unit_events()
+
+        # Then
+        self.assertIsNone(result)
+
+    def test_returns_none_when_bus_has_no_main_loop_to_stream_unit_events(self):
+        # Given
+        system_bus = MagicMock(spec=dbus.SystemBus)
+        system_bus.add_signal_receiver.side_effect = RuntimeError('To make asynchronous calls, receive signals or '
+                                                                  'export objects, D-Bus connections must be attached '
+                                                                  'to a main loop')
+        systemd = SystemdDbus(system_bus)
+
+        # When
+        result = systemd.stream_unit_events()
+
+        # Then
+        self.assertIsNone(result)
+
+    def test_streams_unit_events_tagged_by_manager_into_given_stream(self):
+        # Given
+        transport = InMemoryTransport()
+        systemd = SystemdDbus(transport=transport, manager_name='user@1000')
+        stream = UnitEventStream()
+
+        # When
+        result = systemd.stream_unit_events(stream=stream)
+        transport.emit_signal('/org/freedesktop/systemd1/unit/test_2eservice', 'org.freedesktop.DBus.Properties',
+                              'PropertiesChanged', 'org.freedesktop.systemd1.Unit', {'ActiveState': 'active'}, [])
+        stream.close()
+
+        # Then
+        self.assertIs(stream, result)
+        self.assertEqual([('test.service', 'user@1000')], [(event.unit_name, event.manager) for event in stream])
+
+    def test_returns_selected_properties_of_all_loaded_units(self):
+        # Given
+        system_bus, methods = create_system_bus({
+            'ListUnits': [
+                ('test1.service', 'Test 1', 'loaded', 'active', 'running', '', '/unit/test1', 0, '', '/'),
+                ('test2.service', 'Test 2', 'not-found', 'inactive', 'dead', '', '/unit/test2', 0, '', '/')
+            ],
+            'GetAll': dbus.Dictionary({'Requires': dbus.Array(['test2.service']), 'Id': 'test1.service'})
+        })
+        systemd = SystemdDbus(system_bus)
+
+        # When
+        result = systemd.get_units_properties(['Requires', 'BindsTo'])
+
+        # Then
+        self.assertEqual({'test1.service': {'Requires': ['test2.service']}}, result)
+        system_bus.get_object.assert_called_with('org.freedesktop.systemd1', '/unit/test1')
+        methods['GetAll'].assert_called_once_with('org.freedesktop.systemd1.Unit')
+
+    def test_returns_properties_of_selected_units(self):
+        # Given
+        system_bus, methods = create_system_bus({
+            'ListUnitsByNames': [('test.timer', 'Test', 'loaded', 'active', 'waiting', '', '/unit/test', 0, '', '/')],
+            'GetAll': {'LastTriggerUSec': 42}
+        })
+        systemd = SystemdDbus(system_bus)
+
+        # When
+        result = systemd.get_units_properties(['LastTriggerUSec'], ['test.timer'], 'org.freedesktop.systemd1.Timer')
+
+        # Then
+        self.assertEqual({'test.timer': {'LastTriggerUSec': 42}}, result)
+        methods['ListUnitsByNames'].assert_called_once_with(['test.timer'])
+        methods['GetAll'].assert_called_once_with('org.freedesktop.systemd1.Timer')
+
+    def test_returns_none_when_fails_to_list_units_for_properties(self):
+        # Given
+        system_bus = MagicMock(spec=dbus.SystemBus)
+        system_bus.get_object().get_dbus_method().side_effect = DBusException('Failure')
+        systemd = SystemdDbus(system_bus)
+
+        # When
+        result = systemd.get_units_properties(['Requires'])
+
+        # Then
+        self.assertIsNone(result)
+
+    def test_returns_signal_match_when_manager_signal_handler_is_added(self):
+        # Given
+        system_bus = MagicMock(spec=dbus.SystemBus)
+        systemd = SystemdDbus(system_bus)
+        handler = MagicMock()
+
+        # When
+        result = systemd.add_manager_signal_handler('UnitNew', handler)
+
+        # Then
+        self.assertEqual(system_bus.add_signal_receiver.return_value, result)
+        system_bus.add_signal_receiver.assert_called_once_with(
+            handler, 'UnitNew', 'org.freedesktop.systemd1.Manager', bus_name='org.freedesktop.systemd1',
+            path='/org/freedesktop/systemd1')
+
+    def test_returns_none_when_fails_to_add_manager_signal_handler(self):
+        # Given
+        system_bus = MagicMock(spec=dbus.SystemBus)
+        system_bus.add_signal_receiver.side_effect = DBusException('Failure')
+        systemd = SystemdDbus(system_bus)
+
+        # When
+        result = systemd.add_manager_signal_handler('UnitNew', MagicMock())
+
+        # Then
+        self.assertIsNone(result)
+
+    def test_restarts_services_matching_patterns(self):
+        # Given
+        system_bus, methods = create_system_bus({
+            'ListUnitsByPatterns': [
+                ('worker@1.service', 'Worker 1', 'loaded', 'active', 'running', '', '/unit/worker1', 0, '', '/'),
+                ('worker@2.service', 'Worker 2', 'loaded', 'active', 'running', '', '/unit/worker2', 0, '', '/'),
+                ('worker.timer', 'Worker timer', 'loaded', 'active', 'waiting', '', '/unit/worker', 0, '', '/')
+            ]
+        })
+        systemd = SystemdDbus(system_bus)
+
+        # When
+        result = systemd.restart_services(['worker@*', 'worker.timer'], ['active'])
+
+        # Then
+        self.assertEqual({'worker@1.service': True, 'worker@2.service': True, 'worker.timer': True}, result)
+        methods['ListUnitsByPatterns'].assert_called_once_with(['active'], ['worker@*', 'worker.timer'])
+        self.assertEqual(3, methods['RestartUnit'].call_count)
+        methods['RestartUnit'].assert_any_call('worker.timer', 'replace')
+
+    def test_returns_failed_units_when_fails_to_stop_services(self):
+        # Given
+        system_bus, methods = create_system_bus({
+            'ListUnitsByPatterns': [
+                ('test.socket', 'Test', 'loaded', 'active', 'running', '', '/unit/test', 0, '', '/')
+            ]
+        })
+        methods['StopUnit'] = MagicMock(side_effect=DBusException('Failure'))
+        systemd = SystemdDbus(system_bus)
+
+        # When
+        result = systemd.stop_services(['test.*'], mode='fail')
+
+        # Then
+        self.assertEqual({'test.socket': False}, result)
+        methods['StopUnit'].assert_called_once_with('test.socket', 'fail')
+
+    def test_returns_none_when_fails_to_list_units_of_services_operation(self):
+        # Given
+        system_bus, methods = create_system_bus({})
+        methods['ListUnitsByPatterns'] = MagicMock(side_effect=DBusException('Failure'))
+        systemd = SystemdDbus(system_bus)
+
+        # When
+        result = systemd.restart_services(['worker@*'])
+
+        # Then
+        self.assertIsNone(result)
+        self.assertNotIn('RestartUnit', methods)
+
+    def test_does_not_list_units_when_no_patterns_given(self):
+        # Given
+        system_bus = MagicMock(spec=dbus.SystemBus)
+        systemd = SystemdDbus(system_bus)
+
+        # When
+        result = systemd.start_services([])
+
+        # Then
+        self.assertEqual({}, result)
+        system_bus.get_object.assert_not_called()
+
+    def test_postfixes_only_names_without_unit_type(self):
+        # Given
+        system_bus = MagicMock(spec=dbus.SystemBus)
+        systemd = SystemdDbus(system_bus)
+
+        # When
+        for unit_name in ['test', 'test.timer', 'test.socket', 'my.app', 'timer', 'worker@.service']:
+            systemd.start_service(unit_name)
+
+        # Then
+        self.assertEqual(['test.service', 'test.timer', 'test.socket', 'my.app.service', 'timer.service',
+                          'worker@.service'],
+                         [call.args[0] for call in system_bus.get_object().get_dbus_method().call_args_list])
+
+    def test_uses_given_transport(self):
+        # Given
+        transport = InMemoryTransport()
+        transport.add_method('org.freedesktop.systemd1.Manager', 'LoadUnit',
+                             lambda name: '/org/freedesktop/systemd1/unit/test_2eservice')
+        transport.add_method('org.freedesktop.DBus.Properties', 'GetAll', lambda interface: {'ActiveState': 'active'},
+                             '/org/freedesktop/systemd1/unit/test_2eservice')
+        systemd = SystemdDbus(transport=transport)
+
+        # When
+        result = systemd.is_active('test')
+
+        # Then
+        self.assertTrue(result)
+        self.assertEqual(
+            [('/org/freedesktop/systemd1', 'org.freedesktop.systemd1.Manager', 'LoadUnit', ('test.service',)),
+             ('/org/freedesktop/systemd1/unit/test_2eservice', 'org.freedesktop.DBus.Properties', 'GetAll',
+              ('org.freedesktop.systemd1.Unit',))], transport.calls)
+
+    def test_returns_false_when_transport_fails(self):
+        # Given
+        systemd = SystemdDbus(transport=InMemoryTransport())
+
+        # When
+        result = systemd.reload_daemon()
+
+        # Then
+        self.assertFalse(result)
+
+    def test_passes_configured_timeout_to_method_call(self):
+        # Given
+        system_bus = MagicMock(spec=dbus.SystemBus)
+        systemd = SystemdDbus(system_bus, timeouts={'StartUnit': 0.5})
+
+        # When
+        result = systemd.start_service('test')
+
+        # Then
+        self.assertTrue(result)
+        system_bus.get_object().get_dbus_method().assert_called_with('test.service', 'replace', timeout=0.5)
+
+    def test_returns_stale_active_state_when_deadline_missed(self):
+        # Given
+        system_bus = MagicMock(spec=dbus.SystemBus)
+        system_bus.get_object().get_dbus_method().side_effect = [
+            '/unit/test', {'ActiveState': 'active'},
+            '/unit/test', DBusException('Timed out', name='org.freedesktop.DBus.Error.NoReply')
+        ]
+        systemd = SystemdDbus(system_bus, default_timeout=1, stale_fallback=True)
+        systemd.get_active_state('test')
+
+        # When
+        with systemd.deadline(0.5) as deadline:
+            result = systemd.get_active_state('test')
+
+        # Then
+        self.assertEqual('active', result)
+        self.assertTrue(deadline.stale)
+        self.assertEqual({'deadline_misses': {'GetAll': 1}, 'stale_results': {'GetAll': 1}},
+                         systemd.get_call_statistics())
+
+    def test_marks_stale_active_state_without_deadline_scope(self):
+        # Given
+        system_bus = MagicMock(spec=dbus.SystemBus)
+        system_bus.get_object().get_dbus_method().side_effect = [
+            '/unit/test', {'ActiveState': 'active'},
+            '/unit/test', DBusException('Timed out', name='org.freedesktop.DBus.Error.NoReply'),
+            '/unit/test', {'ActiveState': 'failed'}
+        ]
+        systemd = SystemdDbus(system_bus, timeouts={'GetAll': 0.5}, stale_fallback=True)
+        systemd.get_active_state('test')
+
+        # When
+        stale_result = systemd.get_active_state('test')
+        stale = systemd.is_last_result_stale()
+        result = systemd.get_active_state('test')
+
+        # Then
+        self.assertEqual('active', stale_result)
+        self.assertTrue(stale)
+        self.assertEqual('failed', result)
+        self.assertFalse(systemd.is_last_result_stale())
+
+
+def create_system_bus(return_values):
+    system_bus = MagicMock(spec=dbus.SystemBus)
+    methods = {}
+
+    def get_dbus_method(name, interface):
+        if name not in methods:
+            methods[name] = MagicMock(return_value=return_values.get(name))
+        return methods[name]
+
+    for name in return_values:
+        get_dbus_method(name, None)
+
+    system_bus.get_object().get_dbus_method.side_effect = get_dbus_method
+
+    return system_bus, methods
+
 
 if __name__ == "__main__":
     unittest.main()
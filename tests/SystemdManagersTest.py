@@ -0,0 +1,192 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from context_logger import setup_logging
+
+from systemd_dbus import SystemdManagers, InMemoryTransport, TransportError
+
+MANAGER_INTERFACE = 'org.freedesktop.systemd1.Manager'
+PROPERTIES_INTERFACE = 'org.freedesktop.DBus.Properties'
+UNIT_INTERFACE = 'org.freedesktop.systemd1.Unit'
+
+
+def create_transport(unit_name, active_state='active'):
+    unit_path = f'/org/freedesktop/systemd1/unit/{unit_name.replace(".", "_2e")}'
+    unit = (unit_name, '', 'loaded', active_state, 'running', '', unit_path, 0, '', '/')
+    transport = InMemoryTransport()
+    transport.add_method(MANAGER_INTERFACE, 'ListUnits', lambda: [unit])
+    transport.add_method(MANAGER_INTERFACE, 'ListUnitsByNames', lambda names: [unit] if unit_name in names else [])
+    transport.add_method(MANAGER_INTERFACE, 'ListUnitFilesByPatterns', lambda states, patterns: [])
+    transport.add_method(MANAGER_INTERFACE, 'Subscribe', MagicMock())
+    transport.add_method(MANAGER_INTERFACE, 'Unsubscribe', MagicMock())
+    transport.add_method(PROPERTIES_INTERFACE, 'GetAll', lambda interface: {'ActiveState': active_state}, unit_path)
+    return transport
+
+
+class SystemdManagersTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        setup_logging('systemd-dbus', warn_on_overwrite=False)
+
+    def setUp(self):
+        print()
+        self.runtime_directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.runtime_directory)
+        self.system_transport = create_transport('nginx.service')
+        self.user_transports = {}
+
+    def test_discovers_user_managers(self):
+        # Given
+        self._start_session(1000)
+        self._start_session(1001)
+        os.makedirs(os.path.join(self.runtime_directory, '1002'))
+        managers = self._create_managers()
+
+        # When
+        managers.start()
+
+        # Then
+        self.assertEqual(['system', 'user@1000', 'user@1001'], sorted(managers.get_manager_names()))
+        self.assertEqual([f'unix:path={self.runtime_directory}/1000/bus',
+                          f'unix:path={self.runtime_directory}/1001/bus'], sorted(self.user_transports))
+
+    def test_removes_manager_when_session_ends(self):
+        # Given
+        self._start_session(1000)
+        managers = self._create_managers()
+        managers.start()
+        transport = self.user_transports[f'unix:path={self.runtime_directory}/1000/bus']
+        transport.close = MagicMock()
+        shutil.rmtree(os.path.join(self.runtime_directory, '1000'))
+
+        # When
+        result = managers.refresh()
+
+        # Then
+        self.assertTrue(result)
+        self.assertEqual(['system'], managers.get_manager_names())
+        self.assertIsNone(managers.get_manager('user@1000'))
+        transport.close.assert_called_once()
+
+    def test_returns_units_properties_of_all_managers(self):
+        # Given
+        self._start_session(1000)
+        managers = self._create_managers()
+        managers.start()
+
+        # When
+        result = managers.get_units_properties(['ActiveState'])
+
+        # Then
+        self.assertEqual({
+            'system': {'nginx.service': {'ActiveState': 'active'}},
+            'user@1000': {'kiosk.service': {'ActiveState': 'failed'}}
+        }, result)
+
+    def test_leaves_out_manager_that_fails(self):
+        # Given
+        self._start_session(1000)
+        managers = self._create_managers()
+        managers.start()
+        self.system_transport.add_method(MANAGER_INTERFACE, 'ListUnitsByNames',
+                                         MagicMock(side_effect=TransportError('Failure')))
+
+        # When
+        result = managers.get_unit_states(['kiosk.service'])
+
+        # Then
+        self.assertEqual(['user@1000'], list(result))
+        self.assertEqual('failed', result['user@1000']['kiosk.service'].active_state)
+
+    def test_streams_events_tagged_by_manager(self):
+        # Given
+        self._start_session(1000)
+        managers = self._create_managers()
+        managers.start()
+
+        # When
+        stream = managers.stream_unit_events()
+        self._start_session(1001)
+        managers.refresh()
+        for _, transport in [('system', self.system_transport)] + sorted(self.user_transports.items()):
+            transport.emit_signal('/org/freedesktop/systemd1/unit/test_2eservice', PROPERTIES_INTERFACE,
+                                  'PropertiesChanged', UNIT_INTERFACE, {'ActiveState': 'active'}, [])
+        stream.close()
+
+        # Then
+        self.assertEqual(['system', 'user@1000', 'user@1001'], [event.manager for event in stream])
+
+    def test_closes_user_manager_connections(self):
+        # Given
+        self._start_session(1000)
+        managers = self._create_managers()
+
+        # When
+        with managers:
+            transport = self.user_transports[f'unix:path={self.runtime_directory}/1000/bus']
+            transport.close = MagicMock()
+
+        # Then
+        self.assertEqual(['system'], managers.get_manager_names())
+        transport.close.assert_called_once()
+
+    def test_closes_streams_and_unsubscribes_when_closed(self):
+        # Given
+        self._start_session(1000)
+        managers = self._create_managers()
+        managers.start()
+        stream = managers.stream_unit_events()
+        user_transport = self.user_transports[f'unix:path={self.runtime_directory}/1000/bus']
+        self.system_transport.close = MagicMock()
+
+        # When
+        managers.close()
+
+        # Then
+        self.assertTrue(stream.closed)
+        for transport in [self.system_transport, user_transport]:
+            self.assertEqual(['Subscribe', 'Unsubscribe'], [call[2] for call in transport.calls
+                                                            if call[2] in ['Subscribe', 'Unsubscribe']])
+        self.assertEqual(0, self.system_transport.emit_signal(
+            '/org/freedesktop/systemd1/unit/test_2eservice', PROPERTIES_INTERFACE, 'PropertiesChanged',
+            UNIT_INTERFACE, {'ActiveState': 'active'}, []))
+        self.system_transport.close.assert_not_called()
+
+    def test_uses_and_closes_socket_transport_for_system_manager_by_default(self):
+        # Given
+        system_transport = create_transport('nginx.service')
+        system_transport.close = MagicMock()
+
+        with patch('systemd_dbus.managers.create_transport', return_value=system_transport) as create:
+            managers = SystemdManagers(runtime_directory=self.runtime_directory, discovery_interval=0)
+
+        # When
+        with managers:
+            result = managers.get_units_properties(['ActiveState'])
+
+        # Then
+        create.assert_called_once_with('socket')
+        self.assertEqual({'system': {'nginx.service': {'ActiveState': 'active'}}}, result)
+        system_transport.close.assert_called_once()
+
+    def _create_managers(self):
+        return SystemdManagers(self.system_transport, self.runtime_directory, self._create_user_transport,
+                               discovery_interval=0)
+
+    def _create_user_transport(self, address):
+        transport = create_transport('kiosk.service', 'failed')
+        self.user_transports[address] = transport
+        return transport
+
+    def _start_session(self, uid):
+        os.makedirs(os.path.join(self.runtime_directory, str(uid)))
+        open(os.path.join(self.runtime_directory, str(uid), 'bus'), 'w').close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import subprocess
+import sys
+import unittest
+from unittest import TestCase
+
+from systemd_dbus import create_transport, InMemoryTransport, SocketTransport
+
+
+class TransportTest(TestCase):
+
+    def setUp(self):
+        print()
+
+    def test_creates_transport_of_backend(self):
+        self.assertIsInstance(create_transport('memory'), InMemoryTransport)
+        self.assertIsInstance(create_transport('socket', address='unix:path=/run/user/1000/bus'), SocketTransport)
+
+    def test_raises_error_when_backend_is_unknown(self):
+        with self.assertRaises(ValueError):
+            create_transport('grpc')
+
+    def test_does_not_import_optional_modules_with_package(self):
+        # Given
+        modules = ['asyncio', 'mmap', 'concurrent.futures', 'systemd_dbus.managers', 'systemd_dbus.replay',
+                   'systemd_dbus.snapshot', 'systemd_dbus.socket_transport']
+        script = f'import sys, systemd_dbus; print([name for name in {modules} if name in sys.modules])'
+
+        # When
+        result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True)
+
+        # Then
+        self.assertEqual('[]', result.stdout.strip())
+
+
+if __name__ == "__main__":
+    unittest.main()
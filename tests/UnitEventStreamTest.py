@@ -0,0 +1,138 @@
+import asyncio
+import unittest
+from threading import Timer, Thread
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from systemd_dbus import UnitEventStream, UnitEvent
+
+
+class UnitEventStreamTest(TestCase):
+
+    def setUp(self):
+        print()
+
+    def test_yields_events_until_closed(self):
+        # Given
+        stream = UnitEventStream()
+        stream.put(UnitEvent('test1.service', 'org.freedesktop.systemd1.Unit', {'ActiveState': 'active'}))
+        stream.put(UnitEvent('test2.service', 'org.freedesktop.systemd1.Unit', {'ActiveState': 'failed'}))
+        Timer(0.05, stream.close).start()
+
+        # When
+        result = [event.unit_name for event in stream]
+
+        # Then
+        self.assertEqual(['test1.service', 'test2.service'], result)
+
+    def test_drops_oldest_events_when_full(self):
+        # Given
+        stream = UnitEventStream(max_size=2, policy=UnitEventStream.DROP_OLDEST)
+
+        # When
+        for index in range(5):
+            stream.put(UnitEvent(f'test{index}.service', 'org.freedesktop.systemd1.Unit'))
+        stream.close()
+
+        # Then
+        self.assertEqual(['test3.service', 'test4.service'], [event.unit_name for event in stream])
+        self.assertEqual(3, stream.dropped)
+
+    def test_blocks_producer_when_full(self):
+        # Given
+        stream = UnitEventStream(max_size=1, policy=UnitEventStream.BLOCK)
+        stream.put(UnitEvent('test1.service', 'org.freedesktop.systemd1.Unit'))
+        producer = Thread(target=stream.put, args=[UnitEvent('test2.service', 'org.freedesktop.systemd1.Unit')])
+        producer.start()
+        producer.join(0.05)
+
+        # Then
+        self.assertTrue(producer.is_alive())
+
+        # When
+        self.assertEqual('test1.service', stream.get().unit_name)
+        producer.join(1)
+
+        # Then
+        self.assertFalse(producer.is_alive())
+        self.assertEqual('test2.service', stream.get().unit_name)
+        self.assertEqual(0, stream.dropped)
+
+    def test_releases_blocked_producer_when_closed(self):
+        # Given
+        stream = UnitEventStream(max_size=1, policy=UnitEventStream.BLOCK)
+        stream.put(UnitEvent('test1.service', 'org.freedesktop.systemd1.Unit'))
+        Timer(0.05, stream.close).start()
+
+        # When
+        result = stream.put(UnitEvent('test2.service', 'org.freedesktop.systemd1.Unit'))
+
+        # Then
+        self.assertFalse(result)
+
+    def test_yields_events_asynchronously(self):
+        # Given
+        stream = UnitEventStream()
+        stream.put(UnitEvent('test.service', 'org.freedesktop.systemd1.Unit', {'ActiveState': 'active'}))
+        Timer(0.05, stream.close).start()
+
+        async def consume():
+            return [event async for event in stream]
+
+        # When
+        result = asyncio.run(consume())
+
+        # Then
+        self.assertEqual([UnitEvent('test.service', 'org.freedesktop.systemd1.Unit', {'ActiveState': 'active'})],
+                         result)
+
+    def test_wakes_async_consumer_when_event_is_put_from_other_thread(self):
+        # Given
+        stream = UnitEventStream()
+        Timer(0.02, stream.put, [UnitEvent('test.service', 'org.freedesktop.systemd1.Unit')]).start()
+
+        async def consume():
+            return await asyncio.wait_for(stream.__aiter__().__anext__(), 5)
+
+        # When
+        result = asyncio.run(consume())
+
+        # Then
+        self.assertEqual('test.service', result.unit_name)
+
+    def test_does_not_lose_events_when_async_consumer_is_cancelled(self):
+        # Given
+        stream = UnitEventStream()
+
+        async def consume():
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(stream.__aiter__().__anext__(), 0.05)
+            stream.put(UnitEvent('test.service', 'org.freedesktop.systemd1.Unit'))
+            stream.close()
+            return [event.unit_name async for event in stream]
+
+        # When
+        result = asyncio.run(consume())
+
+        # Then
+        self.assertEqual(['test.service'], result)
+
+    def test_removes_signal_matches_when_closed(self):
+        # Given
+        signal_match = MagicMock()
+
+        # When
+        with UnitEventStream() as stream:
+            stream.add_signal_match(signal_match)
+
+        # Then
+        self.assertTrue(stream.closed)
+        signal_match.remove.assert_called_once()
+
+    def test_raises_error_when_policy_is_unknown(self):
+        with self.assertRaises(ValueError):
+            UnitEventStream(policy='drop-newest')
+
+
+if __name__ == "__main__":
+    unittest.main()